@@ -157,47 +157,20 @@ def migrate_data(mongo_uri: str, mongo_db_name: str, supabase_url: str, supabase
         logger.error(f"Error counting Supabase documents: {e}")
 
 
-def verify_migration(mongo_uri: str, mongo_db_name: str, supabase_url: str, supabase_key: str):
-    """Verify migration by comparing sample data"""
-    
+def verify_migration(mongo_uri: str, mongo_db_name: str):
+    """Verify migration by comparing per-day digests of every document (see verify_dump.py)
+
+    Needs DB_HOST, DB_USER, DB_PASSWORD (and DB_NAME, DB_PORT) for a direct PostgreSQL connection
+    """
+    from verify_dump import connect, mongo_documents, report, verify
+
     logger.info("Verifying migration...")
-    
-    # Connect to both databases
-    mongo_client = MongoClient(mongo_uri)
-    mongo_db = mongo_client[mongo_db_name]
-    collection = mongo_db['slack_messages']
-    
-    supabase = create_client(supabase_url, supabase_key)
-    
-    # Compare counts
-    mongo_count = collection.count_documents({})
-    supabase_response = supabase.from_('garden4.slack_messages').select('*', count='exact').execute()
-    supabase_count = supabase_response.count
-    
-    logger.info(f"MongoDB count: {mongo_count}")
-    logger.info(f"Supabase count: {supabase_count}")
-    
-    if mongo_count == supabase_count:
-        logger.info("✓ Document counts match!")
-    else:
-        logger.warning(f"✗ Document count mismatch: MongoDB {mongo_count} vs Supabase {supabase_count}")
-    
-    # Compare sample documents
-    sample_size = min(10, mongo_count)
-    mongo_samples = list(collection.find().limit(sample_size))
-    
-    for mongo_doc in mongo_samples:
-        ts = mongo_doc.get('ts')
-        if ts:
-            # Find in Supabase
-            supabase_response = supabase.from_('garden4.slack_messages').select('*').eq('ts', ts).execute()
-            
-            if supabase_response.data:
-                logger.info(f"✓ Found document with ts={ts}")
-            else:
-                logger.warning(f"✗ Missing document with ts={ts}")
-    
-    mongo_client.close()
+
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("SET search_path TO garden4")
+    report(verify(mongo_documents(mongo_uri, mongo_db_name), cursor))
+    conn.close()
     logger.info("Verification complete!")
 
 
@@ -217,4 +190,4 @@ if __name__ == "__main__":
     migrate_data(MONGO_URI, MONGO_DB, SUPABASE_URL, SUPABASE_SERVICE_KEY)
     
     # Verify migration
-    verify_migration(MONGO_URI, MONGO_DB, SUPABASE_URL, SUPABASE_SERVICE_KEY)
\ No newline at end of file
+    verify_migration(MONGO_URI, MONGO_DB)
\ No newline at end of file
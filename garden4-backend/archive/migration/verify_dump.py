@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Verify slack_messages in PostgreSQL against a dump (or a running MongoDB)
+
+양쪽에서 날짜(KST)별로 메시지 수와 digest(ts 순으로 정렬한 ts + 내용 hash)를 계산해서 비교하고,
+digest 가 다른 날짜만 메시지 단위로 내려가서 빠진/남는/내용이 다른 ts 를 출력한다.
+DB 쿼리는 날짜별 집계 1번 + 다른 날짜 조회 1번으로 고정.
+
+    DB_HOST=... DB_USER=... DB_PASSWORD=... python archive/migration/verify_dump.py
+    python archive/migration/verify_dump.py --dump archive/20250622_mongodb_dump/garden/slack_messages.json
+    python archive/migration/verify_dump.py --mongo-uri mongodb://localhost:27017/ --mongo-db garden
+
+내용 hash 는 text, user, attachment 별 author_name/text/footer 로 계산한다.
+(bot_profile, 아이콘 등은 sql/005_slim_storage.sql 이후 slack_messages 에 없으므로 비교하지 않음)
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import sys
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Tuple
+
+import psycopg2
+import pytz
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BACKEND_DIR)
+
+from attendance.dump import DEFAULT_DUMP_PATH, read_dump
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+KST = pytz.timezone('Asia/Seoul')
+
+# 서버 cursor 에서 한 번에 가져올 row 수
+ITERSIZE = int(os.getenv('DB_ITERSIZE', '2000'))
+
+# 날짜별 (메시지 수, digest)
+DayDigests = Dict[date, Tuple[int, str]]
+
+# message_digest() 와 같은 값을 SQL 로 계산
+MESSAGE_DIGESTS_SQL = r"""
+    SELECT
+        (to_timestamp(ts::numeric) AT TIME ZONE 'Asia/Seoul')::date AS day,
+        ts,
+        md5(concat_ws(E'\x1f',
+            COALESCE(text, ''),
+            COALESCE("user", ''),
+            COALESCE((
+                SELECT string_agg(concat_ws(E'\x1f',
+                    COALESCE(a.attachment->>'author_name', ''),
+                    COALESCE(a.attachment->>'text', ''),
+                    COALESCE(a.attachment->>'footer', '')
+                ), E'\x1e' ORDER BY a.idx)
+                FROM jsonb_array_elements(
+                    CASE WHEN jsonb_typeof(attachments) = 'array' THEN attachments ELSE '[]'::jsonb END
+                ) WITH ORDINALITY AS a(attachment, idx)
+            ), '')
+        )) AS digest
+    FROM slack_messages
+"""
+
+
+def message_day(ts: str) -> date:
+    return datetime.fromtimestamp(int(Decimal(ts)), KST).date()
+
+
+def message_digest(document: Dict[str, Any]) -> str:
+    attachments = document.get('attachments')
+    if not isinstance(attachments, list):
+        attachments = []
+    content = '\x1f'.join([
+        document.get('text') or '',
+        document.get('user') or '',
+        '\x1e'.join(
+            '\x1f'.join([
+                attachment.get('author_name') or '',
+                attachment.get('text') or '',
+                attachment.get('footer') or '',
+            ])
+            for attachment in attachments
+        ),
+    ])
+    return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+
+def day_digest(messages: Iterable[Tuple[str, str]]) -> str:
+    # SQL 의 string_agg(ts || ':' || digest, ',' ORDER BY ts COLLATE "C") 와 같은 값
+    return hashlib.md5(','.join(f"{ts}:{digest}" for (ts, digest) in sorted(messages)).encode('utf-8')).hexdigest()
+
+
+def document_digests(documents: Iterable[Dict[str, Any]]) -> Dict[date, Dict[str, str]]:
+    """
+    문서를 한 번만 읽으면서 날짜별 {ts: 내용 hash} 를 만든다
+    """
+    days = defaultdict(dict)
+    for document in documents:
+        ts = document.get('ts')
+        if not ts:
+            continue
+        # MongoDB 에 숫자(double)로 들어간 ts 는 Slack 형식 문자열로 맞춤 (1571837358.0 -> 1571837358.000000)
+        if not isinstance(ts, str):
+            ts = f"{Decimal(str(ts)):.6f}"
+        days[message_day(ts)][ts] = message_digest(document)
+    return days
+
+
+def database_day_digests(cursor) -> DayDigests:
+    cursor.execute(f"""
+        WITH messages AS ({MESSAGE_DIGESTS_SQL})
+        SELECT day, COUNT(*), md5(string_agg(ts || ':' || digest, ',' ORDER BY ts COLLATE "C"))
+        FROM messages
+        GROUP BY day
+    """)
+    return {day: (count, digest) for (day, count, digest) in cursor.fetchall()}
+
+
+def database_message_digests(cursor, days: List[date]) -> Dict[date, Dict[str, str]]:
+    # 다른 날짜가 많으면 (예: 덤프를 통째로 다시 넣은 경우) 결과가 크므로 서버 cursor 로 나눠서 읽음
+    stream = cursor.connection.cursor(name='verify_dump_messages')
+    stream.itersize = ITERSIZE
+    stream.execute(f"""
+        WITH messages AS ({MESSAGE_DIGESTS_SQL})
+        SELECT day, ts, digest FROM messages WHERE day = ANY(%s)
+    """, (days,))
+    result = defaultdict(dict)
+    for (day, ts, digest) in stream:
+        result[day][ts] = digest
+    stream.close()
+    return result
+
+
+def verify(documents: Iterable[Dict[str, Any]], cursor) -> Dict[str, Any]:
+    """
+    documents(덤프/MongoDB) 와 slack_messages 를 비교한다
+    return {"days": 비교한 날짜 수, "mismatched_days": [...], "missing": [...], "extra": [...], "changed": [...]}
+    missing 은 DB 에 없는 ts, extra 는 DB 에만 있는 ts, changed 는 내용이 다른 ts
+    """
+    source = document_digests(documents)
+    source_days = {day: (len(messages), day_digest(messages.items())) for (day, messages) in source.items()}
+    database_days = database_day_digests(cursor)
+
+    mismatched_days = sorted(
+        day for day in set(source_days) | set(database_days)
+        if source_days.get(day) != database_days.get(day)
+    )
+
+    result = {"days": len(set(source_days) | set(database_days)), "mismatched_days": mismatched_days,
+              "missing": [], "extra": [], "changed": []}
+    if not mismatched_days:
+        return result
+
+    database = database_message_digests(cursor, mismatched_days)
+    for day in mismatched_days:
+        expected = source.get(day, {})
+        actual = database.get(day, {})
+        result["missing"] += sorted(set(expected) - set(actual))
+        result["extra"] += sorted(set(actual) - set(expected))
+        result["changed"] += sorted(ts for ts in set(expected) & set(actual) if expected[ts] != actual[ts])
+    return result
+
+
+def connect():
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432'),
+        database=os.getenv('DB_NAME', 'postgres'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        sslmode=os.getenv('DB_SSLMODE', 'require'),
+    )
+
+
+def mongo_documents(mongo_uri: str, mongo_db_name: str):
+    from pymongo import MongoClient
+
+    mongo_client = MongoClient(mongo_uri)
+    try:
+        yield from mongo_client[mongo_db_name]['slack_messages'].find({}, {'_id': 0})
+    finally:
+        mongo_client.close()
+
+
+def report(result: Dict[str, Any]) -> bool:
+    logger.info(f"Compared {result['days']} days, {len(result['mismatched_days'])} mismatched")
+    for day in result['mismatched_days']:
+        logger.warning(f"✗ {day}")
+    for key in ('missing', 'extra', 'changed'):
+        for ts in result[key]:
+            logger.warning(f"✗ {key}: ts={ts}")
+    if not result['mismatched_days']:
+        logger.info("✓ All days match!")
+    return not result['mismatched_days']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify slack_messages against a dump or MongoDB")
+    parser.add_argument('--dump', default=DEFAULT_DUMP_PATH, help="mongoexport JSON dump")
+    parser.add_argument('--mongo-uri', help="compare with a running MongoDB instead of the dump")
+    parser.add_argument('--mongo-db', default='garden')
+    parser.add_argument('--schema', default=os.getenv('DB_SCHEMA', 'garden4'))
+    args = parser.parse_args()
+
+    if args.mongo_uri:
+        documents = mongo_documents(args.mongo_uri, args.mongo_db)
+    else:
+        documents = read_dump(args.dump)
+
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute(f"SET search_path TO {args.schema}")
+    started = datetime.now()
+    ok = report(verify(documents, cursor))
+    logger.info(f"Verification took {(datetime.now() - started).total_seconds():.2f}s")
+    conn.close()
+    sys.exit(0 if ok else 1)
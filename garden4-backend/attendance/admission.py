@@ -0,0 +1,172 @@
+"""
+무거운 요청 admission control (load shedding)
+
+전체 출석부(gets), 작업 등록(collect, csv) 같은 무거운 요청이 한꺼번에 몰리면 (알림 시각, 링크 공유)
+웹 thread 와 DB 연결을 모두 잡아서 가벼운 페이지까지 뒤에서 기다리게 된다.
+요청을 view 이름으로 등급(settings.ADMISSION_CLASSES)을 나누고
+
+- 등급별로 동시에 실행할 수(concurrency)와 자리를 기다릴 수 있는 요청 수(queue)를 제한
+- 프로세스 전체 동시 실행 수는 ADMISSION_MAX_CONCURRENCY. 그 중 ADMISSION_RESERVED 개는 나머지(default) 요청 몫으로 남겨둠
+
+대기열이 가득 차 있으면 바로 429, ADMISSION_MAX_WAIT 초를 기다려도 자리가 나지 않으면 503. 둘 다 Retry-After 를 붙임
+프로세스 안의 thread 들끼리 세므로 runserver 나 gunicorn --threads 처럼 thread 로 요청을 받을 때 의미가 있다.
+등급별 통계는 /attendance/api/admission
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+# ADMISSION_CLASSES 에서 views 가 없는 등급. 다른 등급에 속하지 않은 모든 요청
+DEFAULT_CLASS = 'default'
+
+
+class AdmissionController:
+    """
+    등급별 실행 중/대기 중인 요청 수를 세고 자리를 나눠줌
+    stats: 등급별 admitted(실행), queued(기다린 뒤 실행 또는 실패), rejected(429), timed_out(503), wait_seconds
+    """
+
+    def __init__(self, max_concurrency, reserved, max_wait, classes):
+        self.max_concurrency = max_concurrency
+        self.reserved = reserved
+        self.max_wait = max_wait
+        self.classes = classes
+        self.view_classes = {view: name for (name, options) in classes.items() for view in options.get('views', ())}
+        self.condition = threading.Condition()
+        self.running = Counter()
+        self.waiting = Counter()
+        self.stats = {name: Counter() for name in classes}
+
+    def class_of(self, view_name):
+        return self.view_classes.get(view_name, DEFAULT_CLASS)
+
+    def can_run(self, name):
+        total = sum(self.running.values())
+        if name == DEFAULT_CLASS:
+            return total < self.max_concurrency
+        return (self.running[name] < self.classes[name]['concurrency']
+                and total < self.max_concurrency - self.reserved)
+
+    def acquire(self, name):
+        """
+        자리를 잡으면 None. 못 잡으면 응답할 status (429: 대기열이 가득 참, 503: 기다려도 자리가 안 남)
+        자리를 잡았으면 끝난 뒤 release(name)
+        """
+        stats = self.stats[name]
+        with self.condition:
+            if not self.can_run(name):
+                if self.waiting[name] >= self.classes[name]['queue']:
+                    stats['rejected'] += 1
+                    return 429
+
+                stats['queued'] += 1
+                self.waiting[name] += 1
+                started = time.monotonic()
+                deadline = started + self.max_wait
+                try:
+                    while not self.can_run(name):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            stats['timed_out'] += 1
+                            return 503
+                        self.condition.wait(remaining)
+                finally:
+                    self.waiting[name] -= 1
+                    stats['wait_seconds'] += time.monotonic() - started
+
+            self.running[name] += 1
+            stats['admitted'] += 1
+            return None
+
+    def release(self, name):
+        with self.condition:
+            self.running[name] -= 1
+            self.condition.notify_all()
+
+    def snapshot(self):
+        with self.condition:
+            classes = {}
+            for (name, options) in self.classes.items():
+                stats = self.stats[name]
+                classes[name] = {
+                    "concurrency": options.get('concurrency', self.max_concurrency),
+                    "queue": options['queue'],
+                    "running": self.running[name],
+                    "waiting": self.waiting[name],
+                    "admitted": stats['admitted'],
+                    "queued": stats['queued'],
+                    "rejected": stats['rejected'],
+                    "timed_out": stats['timed_out'],
+                    "wait_seconds": round(stats['wait_seconds'], 3),
+                }
+            return {
+                "max_concurrency": self.max_concurrency,
+                "reserved": self.reserved,
+                "max_wait": self.max_wait,
+                "classes": classes,
+            }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    """
+    프로세스에 하나. settings.ADMISSION_MAX_CONCURRENCY 가 0 이면 None (제한하지 않음)
+    """
+    global _controller
+    if settings.ADMISSION_MAX_CONCURRENCY <= 0:
+        return None
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(
+                settings.ADMISSION_MAX_CONCURRENCY,
+                settings.ADMISSION_RESERVED,
+                settings.ADMISSION_MAX_WAIT,
+                settings.ADMISSION_CLASSES,
+            )
+        return _controller
+
+
+def view_name(path):
+    try:
+        return resolve(path).func.__name__
+    except Resolver404:
+        return None
+
+
+class AdmissionMiddleware:
+    """
+    view 를 부르기 전에 등급의 자리를 잡고, 응답을 만든 뒤 돌려줌
+    StreamingHttpResponse(api/live) 는 view 가 응답을 돌려줄 때 자리를 돌려줌. 본문을 보내는 동안은 세지 않음
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.controller = get_controller()
+        if self.controller is None:
+            raise MiddlewareNotUsed()
+
+    def __call__(self, request):
+        name = self.controller.class_of(view_name(request.path_info))
+        status = self.controller.acquire(name)
+        if status is not None:
+            logger.warning("admission: %s %s %s", status, name, request.path)
+            response = JsonResponse({"error": "busy", "class": name}, status=status)
+            response["Retry-After"] = str(settings.ADMISSION_RETRY_AFTER)
+            return response
+
+        try:
+            return self.get_response(request)
+        finally:
+            self.controller.release(name)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AttendanceConfig(AppConfig):
     name = 'attendance'
+
+    def ready(self):
+        # system check 등록 (attendance.W001)
+        from . import checks
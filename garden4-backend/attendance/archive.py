@@ -0,0 +1,314 @@
+"""
+끝난 시즌 보관 (Parquet)
+
+시즌이 끝나면 그 기간의 메시지, 커밋, 출석부를 컬럼 단위 압축 파일로 쓰고 slack_messages 에서 지울 수 있다.
+출석부/커밋 내역은 이 파일과 DB 를 합쳐서 읽고, 통계는 attendance.parquet 를 읽으므로 지운 뒤에도 그대로 보인다.
+검색(commit_search) 은 지울 때 같이 지워지므로 지운 시즌은 검색되지 않는다 (search_api 응답의 archived)
+
+    <ARCHIVE_DIR>/<slug>/manifest.json
+    <ARCHIVE_DIR>/<slug>/messages.parquet     메시지 원본 (attachments, raw 는 JSON 문자열). 복원용
+    <ARCHIVE_DIR>/<slug>/commits.parquet      attachment 한 개가 한 row. author_name, ts 순으로 정렬
+    <ARCHIVE_DIR>/<slug>/attendance.parquet   유저, 출석일(gardening_date), 첫 출석 시간, 커밋 수
+
+commits.parquet 는 author_name 순으로 정렬해서 row group 을 작게 나눠 쓰므로
+한 유저를 읽을 때 필요한 컬럼의 해당 row group 만 읽는다.
+
+pyarrow 가 필요함 (pip install pyarrow). ARCHIVE_DIR 에 보관본이 없으면 import 하지 않음
+"""
+
+import itertools
+import json
+import os
+import shutil
+from datetime import datetime, time, timedelta
+
+import psycopg2.extras
+
+# row group 크기. 작을수록 유저별 조회시 건너뛰는 양이 많아짐
+COMMITS_ROW_GROUP_SIZE = 1000
+COMPRESSION = "zstd"
+
+# manifest.json 경로 -> (mtime, size, manifest). 출석부를 읽을 때마다 파일을 열지 않도록 바뀌었을 때만 다시 읽음
+_manifests = {}
+
+
+def pyarrow_modules():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("archive 를 읽고 쓰려면 pyarrow 가 필요합니다 (pip install pyarrow)")
+    return (pyarrow, pyarrow.parquet)
+
+
+"""
+시즌 기간 (KST). 시작일 0시부터 마지막 날 다음날 새벽 4시 전까지
+(새벽 4시 전 메시지는 전날 출석이 될 수 있으므로)
+"""
+def season_range(garden):
+    start = datetime.combine(garden.start_date, time())
+    end = datetime.combine(garden.start_date + timedelta(days=int(garden.gardening_days)), time(hour=4))
+    return (start, end)
+
+
+def archive_path(garden):
+    if not garden.archive_dir:
+        return None
+    return os.path.join(garden.archive_dir, garden.slug)
+
+
+def read_manifest(garden):
+    """
+    보관본의 manifest. 없으면 None
+    파일의 mtime, 크기가 그대로면 전에 읽은 것을 돌려주므로 고치지 말 것
+    """
+    path = archive_path(garden)
+    if path is None:
+        return None
+    path = os.path.join(path, "manifest.json")
+    try:
+        stat = os.stat(path)
+    except OSError:
+        _manifests.pop(path, None)
+        return None
+
+    cached = _manifests.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    try:
+        with open(path) as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    manifest["from"] = datetime.fromisoformat(manifest["from"])
+    manifest["until"] = datetime.fromisoformat(manifest["until"])
+    _manifests[path] = (stat.st_mtime_ns, stat.st_size, manifest)
+    return manifest
+
+
+# 보관된 기간을 빼는 조건. find_attendance_by_user 등에서 DB 와 보관본이 겹치지 않게 함
+def exclude_archived_sql(garden, manifest, column="ts_at"):
+    return (f" AND ({column} < %s OR {column} >= %s)",
+            [garden.kst.localize(manifest["from"]), garden.kst.localize(manifest["until"])])
+
+
+def iter_attends_by_user(garden, user, since=None):
+    """
+    보관본에서 유저의 출석(메시지) 을 ts 순서로 돌려줌. Garden.iter_attends_by_user 와 같은 형식 (gardening_date, attend)
+    """
+    (pyarrow, parquet) = pyarrow_modules()
+    filters = [("author_name", "=", user)]
+    if since is not None:
+        filters.append(("datetime", ">=", since))
+    table = parquet.read_table(
+        os.path.join(archive_path(garden), "commits.parquet"),
+        columns=["ts", "datetime", "idx", "text"],
+        filters=filters,
+    ).sort_by([("ts", "ascending"), ("idx", "ascending")])
+
+    rows = zip(*(table.column(name).to_pylist() for name in ("ts", "datetime", "text")))
+    for (ts, message_rows) in itertools.groupby(rows, key=lambda row: row[0]):
+        message_rows = list(message_rows)
+        ts_datetime = message_rows[0][1]
+        yield (garden.get_gardening_date(ts_datetime), {"ts": ts_datetime, "message": [text or "" for (_, _, text) in message_rows]})
+
+
+def commits_by_user(garden, user, before=None, limit=50):
+    """
+    보관본에서 유저의 커밋 내역. Garden.find_commits_by_user 와 같은 형식, ts 최신순
+    """
+    (pyarrow, parquet) = pyarrow_modules()
+    filters = [("author_name", "=", user)]
+    if before is not None:
+        filters.append(("ts", "<", before))
+    table = parquet.read_table(
+        os.path.join(archive_path(garden), "commits.parquet"),
+        columns=["ts", "datetime", "idx", "text"],
+        filters=filters,
+    ).sort_by([("ts", "descending"), ("idx", "ascending")])
+
+    commits = []
+    rows = zip(*(table.column(name).to_pylist() for name in ("ts", "datetime", "text")))
+    for (ts, message_rows) in itertools.islice(itertools.groupby(rows, key=lambda row: row[0]), limit):
+        message_rows = list(message_rows)
+        commits.append({"ts": ts, "datetime": message_rows[0][1], "message": [text or "" for (_, _, text) in message_rows]})
+    return commits
+
+
+def attendance_by_user(garden):
+    """
+    보관본 출석부(attendance.parquet) 에서 유저별 출석일. {user: {gardening_date: first_ts}}
+    보관된 시즌의 통계는 commits.parquet 로 출석을 다시 판정하지 않고 이것만 읽음
+    """
+    (pyarrow, parquet) = pyarrow_modules()
+    table = parquet.read_table(
+        os.path.join(archive_path(garden), "attendance.parquet"),
+        columns=["user", "gardening_date", "first_ts"],
+    )
+    result = {}
+    for (user, date, first_ts) in zip(*(table.column(name).to_pylist() for name in ("user", "gardening_date", "first_ts"))):
+        result.setdefault(user, {})[date] = first_ts
+    return result
+
+
+def season_message_rows(garden, season_from, season_until):
+    query = """
+        SELECT sm.ts, sm.ts_for_db, sm.ts_at AT TIME ZONE 'Asia/Seoul' AS datetime,
+               sm.text, sm."user", sm.attachments, r.payload AS raw
+        FROM slack_messages sm
+        LEFT JOIN slack_message_raw r ON r.ts = sm.ts
+        WHERE sm.ts_at >= %s AND sm.ts_at < %s
+        ORDER BY sm.ts
+    """
+    return garden.stream(query, (garden.kst.localize(season_from), garden.kst.localize(season_until)),
+                         cursor_factory=psycopg2.extras.RealDictCursor)
+
+
+def write_season(garden, now=None):
+    """
+    garden 의 시즌 기간 메시지/커밋/출석부를 ARCHIVE_DIR/<slug>/ 에 쓴다. manifest 를 돌려줌
+    다 쓴 뒤에 디렉토리를 rename 하므로 중간에 실패하면 이전 보관본이 그대로 남음
+    """
+    from .garden import parse_repository
+
+    (pyarrow, parquet) = pyarrow_modules()
+    path = archive_path(garden)
+    if path is None:
+        raise RuntimeError("ARCHIVE_DIR is not set")
+
+    previous = read_manifest(garden)
+    if previous is not None and previous.get("purged_at"):
+        raise RuntimeError(f"season {garden.slug} is already archived and purged from the database")
+
+    (season_from, season_until) = season_range(garden)
+    now = now or datetime.now(garden.kst).replace(tzinfo=None)
+    if now < season_until:
+        raise RuntimeError(f"season {garden.slug} is not finished (until {season_until})")
+
+    messages = {"ts": [], "ts_for_db": [], "text": [], "user": [], "attachments": [], "raw": []}
+    commits = []
+    for row in season_message_rows(garden, season_from, season_until):
+        messages["ts"].append(row["ts"])
+        messages["ts_for_db"].append(row["ts_for_db"])
+        messages["text"].append(row["text"])
+        messages["user"].append(row["user"])
+        messages["attachments"].append(json.dumps(row["attachments"], ensure_ascii=False) if row["attachments"] is not None else None)
+        messages["raw"].append(json.dumps(row["raw"], ensure_ascii=False) if row["raw"] is not None else None)
+        for (idx, attachment) in enumerate(row["attachments"] or []):
+            commits.append({
+                "author_name": attachment.get("author_name"),
+                "ts": row["ts"],
+                "idx": idx,
+                "datetime": row["datetime"],
+                "text": attachment.get("text"),
+                "repository": parse_repository(attachment.get("footer")),
+            })
+    commits.sort(key=lambda commit: (commit["author_name"] or "", commit["ts"], commit["idx"]))
+
+    # 출석부도 같이 남김 (통계, 분석용). 출석 판정은 Garden.build_attendance 와 같음
+    season_end_date = garden.start_date + timedelta(days=int(garden.gardening_days))
+    attendance = {"user": [], "gardening_date": [], "first_ts": [], "commit_count": []}
+    for (user, user_commits) in itertools.groupby(commits, key=lambda commit: commit["author_name"]):
+        if user not in garden.users:
+            continue
+        attends = [
+            (garden.get_gardening_date(message_commits[0]["datetime"]),
+             {"ts": message_commits[0]["datetime"], "message": [commit["text"] for commit in message_commits]})
+            for message_commits in (list(group) for (_, group) in itertools.groupby(user_commits, key=lambda commit: commit["ts"]))
+        ]
+        for (date, date_attends) in sorted(garden.build_attendance(attends, {}).items()):
+            if garden.start_date <= date < season_end_date:
+                attendance["user"].append(user)
+                attendance["gardening_date"].append(date)
+                attendance["first_ts"].append(date_attends[0]["ts"])
+                attendance["commit_count"].append(sum(len(attend["message"]) for attend in date_attends))
+
+    build_dir = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+    try:
+        parquet.write_table(pyarrow.table(messages, schema=pyarrow.schema([
+            ("ts", pyarrow.string()),
+            ("ts_for_db", pyarrow.timestamp("us")),
+            ("text", pyarrow.string()),
+            ("user", pyarrow.string()),
+            ("attachments", pyarrow.string()),
+            ("raw", pyarrow.string()),
+        ])), os.path.join(build_dir, "messages.parquet"), compression=COMPRESSION)
+
+        parquet.write_table(pyarrow.Table.from_pylist(commits, schema=pyarrow.schema([
+            ("author_name", pyarrow.string()),
+            ("ts", pyarrow.string()),
+            ("idx", pyarrow.int16()),
+            ("datetime", pyarrow.timestamp("us")),
+            ("text", pyarrow.string()),
+            ("repository", pyarrow.string()),
+        ])), os.path.join(build_dir, "commits.parquet"), compression=COMPRESSION, row_group_size=COMMITS_ROW_GROUP_SIZE)
+
+        parquet.write_table(pyarrow.table(attendance, schema=pyarrow.schema([
+            ("user", pyarrow.string()),
+            ("gardening_date", pyarrow.date32()),
+            ("first_ts", pyarrow.timestamp("us")),
+            ("commit_count", pyarrow.int32()),
+        ])), os.path.join(build_dir, "attendance.parquet"), compression=COMPRESSION)
+
+        manifest = {
+            "slug": garden.slug,
+            "start_date": str(garden.start_date),
+            "gardening_days": int(garden.gardening_days),
+            "from": season_from.isoformat(),
+            "until": season_until.isoformat(),
+            "messages": len(messages["ts"]),
+            "commits": len(commits),
+            "created_at": now.isoformat(),
+        }
+        with open(os.path.join(build_dir, "manifest.json"), "w") as file:
+            json.dump(manifest, file, indent=2)
+
+        # 다시 읽어서 row 수 확인
+        if parquet.read_metadata(os.path.join(build_dir, "messages.parquet")).num_rows != manifest["messages"]:
+            raise RuntimeError("messages.parquet row count mismatch")
+
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(build_dir, path)
+    except Exception:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    return manifest
+
+
+def purge_season(garden, manifest):
+    """
+    보관한 기간의 메시지를 slack_messages 에서 지움. slack_message_raw, commit_search 는 FK 로 같이 지워짐
+    repository_activity 는 누적 집계이므로 그대로 둠
+    보관본의 메시지 수와 지울 메시지 수가 다르면 지우지 않음
+    """
+    conn = garden.connect_postgres()
+    cursor = conn.cursor()
+    params = (garden.kst.localize(manifest["from"]), garden.kst.localize(manifest["until"]))
+    cursor.execute("DELETE FROM slack_messages WHERE ts_at >= %s AND ts_at < %s", params)
+    deleted = cursor.rowcount
+    if deleted != manifest["messages"]:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+        raise RuntimeError(f"expected {manifest['messages']} messages, found {deleted}. archive again before purging")
+    conn.commit()
+    garden.mark_written(cursor)
+    cursor.close()
+    conn.close()
+
+    # 지운 뒤에는 다시 보관하지 않도록 manifest 에 기록
+    path = os.path.join(archive_path(garden), "manifest.json")
+    with open(path) as file:
+        saved = json.load(file)
+    saved["purged_at"] = datetime.now(garden.kst).replace(tzinfo=None).isoformat()
+    with open(path + ".tmp", "w") as file:
+        json.dump(saved, file, indent=2)
+    os.replace(path + ".tmp", path)
+
+    garden.attendance_cache.invalidate_all()
+    return deleted
@@ -0,0 +1,128 @@
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import archive
+from .ranking import apply_today, compute_stats, season_dates
+
+# 출석 판정이 끝난 날(새벽 4시가 지난 날)은 바뀌지 않으므로 길게 캐시
+HISTORY_TIMEOUT = 60 * 60 * 24 * 2
+
+
+def before(attendance, since):
+    """
+    since 이전 메시지만으로 만든 출석부. since 이후 메시지만 있던 날짜는 빠짐
+    """
+    result = {}
+    for (date, commits) in attendance.items():
+        commits = [commit for commit in commits if commit["ts"] < since]
+        if commits:
+            result[date] = commits
+    return result
+
+
+class AttendanceCache:
+    """
+    유저별 출석부 read-through 캐시 (Django cache framework 사용)
+
+    출석부를 두 segment 로 나눠서 저장한다.
+    - history: 오늘(gardening date) 이전의 날짜들. 판정이 끝났으므로 오늘 날짜가 바뀌기 전까지 그대로 사용
+    - live: 오늘 이후의 날짜들. ATTENDANCE_CACHE_TIMEOUT 동안만 사용
+
+    수집(ingest)이 일어나면 version 을 올려서 무효화한다.
+    오늘 메시지만 들어왔으면 live version 만, 판정이 끝난 날의 메시지가 들어왔으면 history version 도 올린다.
+    """
+
+    def __init__(self, garden):
+        self.garden = garden
+        self.prefix = f"garden4:attendance:{garden.slug}"
+        self.live_timeout = getattr(settings, 'ATTENDANCE_CACHE_TIMEOUT', 60)
+
+    def _version(self, name):
+        key = f"{self.prefix}:version:{name}"
+        # 처음이면 1로 시작. add 는 키가 없을때만 저장함
+        cache.add(key, 1, timeout=None)
+        return cache.get(key, 1)
+
+    def _bump(self, name):
+        key = f"{self.prefix}:version:{name}"
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, timeout=None)
+
+    def get(self, user, now=None):
+        gardening_date = self.garden.get_gardening_date(now)
+
+        history_key = f"{self.prefix}:{user}:history:{gardening_date}:v{self._version('history')}"
+        history = cache.get(history_key)
+        if history is None:
+            attendance = self.garden.find_attendance_by_user(user)
+            history = {date: commits for (date, commits) in attendance.items() if date < gardening_date}
+            live = {date: commits for (date, commits) in attendance.items() if date >= gardening_date}
+            cache.set(history_key, history, timeout=HISTORY_TIMEOUT)
+            cache.set(self._live_key(user, gardening_date), live, timeout=self.live_timeout)
+            return attendance
+
+        live_key = self._live_key(user, gardening_date)
+        live = cache.get(live_key)
+        if live is None:
+            # 오늘 0시 이후 메시지만 읽어서 0시 시점의 출석부 위에 다시 쌓음
+            # history 에는 오늘 0~4시 메시지로 채워진 전날이 들어있을 수 있으므로 0시 이전 메시지만 남김
+            # (그대로 쓰면 그 메시지를 다시 읽을 때 전날이 이미 출석한 것으로 보여서 오늘로 한 번 더 셈)
+            since = datetime.combine(gardening_date, time())
+            attendance = self.garden.find_attendance_by_user(user, since=since, result=before(history, since))
+            live = {date: commits for (date, commits) in attendance.items() if date >= gardening_date}
+            cache.set(live_key, live, timeout=self.live_timeout)
+
+        attendance = dict(history)
+        attendance.update(live)
+        return attendance
+
+    def get_stats(self, now=None):
+        """
+        전체 유저 통계. 어제까지의 통계는 history 와 같이 캐시하고 오늘 출석 여부만 매번 반영함
+        보관된(끝난) 시즌은 보관본의 출석부(attendance.parquet) 로 계산함
+        """
+        gardening_date = self.garden.get_gardening_date(now)
+        dates = season_dates(self.garden.start_date, self.garden.gardening_days, gardening_date)
+        in_season = len(dates) < int(self.garden.gardening_days)
+
+        if archive.read_manifest(self.garden) is not None:
+            archived = archive.attendance_by_user(self.garden)
+            attendance_by_user = {user: archived.get(user, {}) for user in self.garden.users}
+        else:
+            attendance_by_user = {user: self.get(user, now) for user in self.garden.users}
+
+        stats_key = f"{self.prefix}:stats:{gardening_date}:v{self._version('history')}"
+        stats = cache.get(stats_key)
+        if stats is None:
+            stats = compute_stats(attendance_by_user, dates)
+            cache.set(stats_key, stats, timeout=HISTORY_TIMEOUT)
+
+        for (user, member) in stats.items():
+            apply_today(member, in_season and gardening_date in attendance_by_user[user])
+
+        return stats
+
+    def _live_key(self, user, gardening_date):
+        return f"{self.prefix}:{user}:live:{gardening_date}:v{self._version('live')}"
+
+    def invalidate(self, messages):
+        if not messages:
+            return
+
+        # 오늘 새벽 4시 이전 메시지는 이미 끝난 날의 출석에 영향을 줌
+        gardening_date = self.garden.get_gardening_date()
+        cutoff = datetime.combine(gardening_date, time(hour=4))
+        oldest = min(float(message["ts"]) for message in messages)
+        oldest_kst = datetime.fromtimestamp(oldest, self.garden.kst).replace(tzinfo=None)
+
+        self._bump('live')
+        if oldest_kst < cutoff:
+            self._bump('history')
+
+    def invalidate_all(self):
+        self._bump('live')
+        self._bump('history')
@@ -0,0 +1,197 @@
+"""
+GitHub 아바타 로컬 캐시
+
+유저마다 원본을 한 번 받아서 크기별(SIZES)로 줄인 파일을 AVATAR_DIR 에 저장하고,
+페이지는 GitHub CDN 대신 여기서 받는다. 파일 경로에 원본의 hash 가 들어가므로 오래 캐시해도 됨
+
+    <AVATAR_DIR>/<user>/manifest.json           hash, 받은 시각, ETag
+    <AVATAR_DIR>/<user>/<hash>/<size>.<ext>     크기별 파일
+
+AVATAR_MAX_AGE 가 지난 아바타는 일단 있는 파일로 응답하고 thread 에서 다시 받는다 (ETag 가 같으면 시각만 갱신)
+원본 주소는 AVATAR_ORIGIN. 로컬에서는 loadtest/avatar_origin.py 로 대신할 수 있음
+크기를 줄이려면 Pillow 가 필요함 (pip install Pillow). 없으면 모든 크기에 원본을 그대로 저장
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+
+SIZES = (60, 80, 200)
+FETCH_TIMEOUT_SECONDS = 10
+EXTENSIONS = {"PNG": "png", "JPEG": "jpg", "GIF": "gif"}
+CONTENT_TYPES = {"png": "image/png", "jpg": "image/jpeg", "gif": "image/gif"}
+
+# 같은 프로세스에서 한 유저를 동시에 받지 않도록
+_fetch_locks = {}
+_fetch_locks_lock = threading.Lock()
+_refreshing = set()
+
+
+def user_dir(garden, user):
+    return os.path.join(garden.avatar_dir, user)
+
+
+def read_manifest(garden, user):
+    try:
+        with open(os.path.join(user_dir(garden, user), "manifest.json")) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def file_path(garden, user, digest, size):
+    manifest = read_manifest(garden, user)
+    if manifest is None or manifest["hash"] != digest and manifest.get("previous_hash") != digest:
+        return None
+    ext = manifest["ext"] if manifest["hash"] == digest else manifest["previous_ext"]
+    path = os.path.join(user_dir(garden, user), digest, f"{size}.{ext}")
+    return (path, CONTENT_TYPES[ext]) if os.path.exists(path) else None
+
+
+def origin_url(garden, user):
+    return garden.avatar_origin.rstrip("/") + "/" + user
+
+
+def resize(content, size):
+    """
+    원본을 size x size 안에 들어오게 줄임. (내용, 확장자)
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    image = Image.open(io.BytesIO(content))
+    ext = EXTENSIONS.get(image.format, "png")
+    if ext == "gif":
+        # 움직이는 gif 는 첫 장면만 씀
+        ext = "png"
+    image = image.convert("RGB" if ext == "jpg" else "RGBA")
+    image.thumbnail((size, size), Image.LANCZOS)
+
+    output = io.BytesIO()
+    if ext == "jpg":
+        image.save(output, "JPEG", quality=85, optimize=True)
+    else:
+        image.save(output, "PNG", optimize=True)
+    return (output.getvalue(), ext)
+
+
+def original_ext(content_type):
+    for (ext, value) in CONTENT_TYPES.items():
+        if content_type.startswith(value):
+            return ext
+    return "png"
+
+
+def fetch(garden, user):
+    """
+    원본을 받아서 크기별 파일을 저장하고 manifest 를 돌려줌. 받지 못하면 예외
+    ETag 가 같으면(304) 파일은 그대로 두고 받은 시각만 갱신
+    """
+    manifest = read_manifest(garden, user)
+    request = urllib.request.Request(origin_url(garden, user), headers={"User-Agent": "garden4"})
+    if manifest is not None and manifest.get("etag"):
+        request.add_header("If-None-Match", manifest["etag"])
+
+    try:
+        with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT_SECONDS) as response:
+            content = response.read()
+            content_type = response.headers.get("Content-Type", "")
+            etag = response.headers.get("ETag")
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and manifest is not None:
+            manifest["fetched_at"] = time.time()
+            write_manifest(garden, user, manifest)
+            return manifest
+        raise
+
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    if manifest is not None and manifest["hash"] == digest:
+        manifest.update(fetched_at=time.time(), etag=etag)
+        write_manifest(garden, user, manifest)
+        return manifest
+
+    # 다 쓴 뒤에 디렉토리를 rename 하므로 쓰는 중인 파일을 내려주지 않음
+    directory = user_dir(garden, user)
+    build_dir = os.path.join(directory, f".{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+    ext = original_ext(content_type)
+    for size in SIZES:
+        resized = resize(content, size)
+        (data, ext) = resized if resized is not None else (content, ext)
+        with open(os.path.join(build_dir, f"{size}.{ext}"), "wb") as file:
+            file.write(data)
+    shutil.rmtree(os.path.join(directory, digest), ignore_errors=True)
+    os.rename(build_dir, os.path.join(directory, digest))
+
+    # 바로 전 버전은 남겨둠 (이전 주소를 캐시한 브라우저용). 그 전 것들은 지움
+    new_manifest = {"hash": digest, "ext": ext, "etag": etag, "fetched_at": time.time()}
+    if manifest is not None:
+        new_manifest.update(previous_hash=manifest["hash"], previous_ext=manifest["ext"])
+    write_manifest(garden, user, new_manifest)
+    for name in os.listdir(directory):
+        if name not in (digest, new_manifest.get("previous_hash"), "manifest.json") and not name.startswith("."):
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return new_manifest
+
+
+def write_manifest(garden, user, manifest):
+    path = os.path.join(user_dir(garden, user), "manifest.json")
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, path)
+
+
+def fetch_lock(user):
+    with _fetch_locks_lock:
+        return _fetch_locks.setdefault(user, threading.Lock())
+
+
+def refresh_in_background(garden, user):
+    with _fetch_locks_lock:
+        if user in _refreshing:
+            return
+        _refreshing.add(user)
+
+    def refresh():
+        try:
+            with fetch_lock(user):
+                fetch(garden, user)
+        except Exception as e:
+            print(f"avatar refresh failed ({user}): {e}")
+        finally:
+            with _fetch_locks_lock:
+                _refreshing.discard(user)
+
+    threading.Thread(target=refresh, name=f"garden4-avatar-{user}", daemon=True).start()
+
+
+def get(garden, user):
+    """
+    유저의 아바타 manifest. 처음이면 받아서 저장하고, 오래됐으면 있는 것을 돌려주고 뒤에서 다시 받음
+    처음 받기에 실패하면 None
+    """
+    manifest = read_manifest(garden, user)
+    if manifest is None:
+        with fetch_lock(user):
+            # 기다리는 동안 다른 요청이 받았을 수 있음
+            manifest = read_manifest(garden, user)
+            if manifest is None:
+                os.makedirs(user_dir(garden, user), exist_ok=True)
+                try:
+                    manifest = fetch(garden, user)
+                except (OSError, ValueError) as e:
+                    print(f"avatar fetch failed ({user}): {e}")
+                    return None
+    elif time.time() - manifest["fetched_at"] > garden.avatar_max_age:
+        refresh_in_background(garden, user)
+    return manifest
@@ -0,0 +1,48 @@
+"""
+여러 프로세스가 함께 써야 하는 캐시 설정 확인
+
+출석부 캐시 무효화(attendance_cache) 와 replica read-your-writes 의 WAL 위치(Garden.mark_written) 는
+Django cache 로 프로세스 사이에 전달된다. 수집은 웹 프로세스가 아니라 cli_collect.py 같은 다른 프로세스에서 하므로
+프로세스 로컬 캐시(LocMemCache)면 수집 뒤에도 웹 프로세스의 캐시가 그대로 남는다. REDIS_URL 로 공유 캐시를 설정할 것
+"""
+
+import sys
+
+from django.conf import settings
+from django.core import checks
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+_warned = set()
+
+
+def cache_is_shared():
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+# 같은 경고는 프로세스에서 한 번만 (Garden 은 요청마다 새로 만듦)
+def warn_once(message):
+    if message not in _warned:
+        _warned.add(message)
+        print(f"WARNING: {message}", file=sys.stderr)
+
+
+# 수집하는 프로세스(cli_collect.py 등) 시작할 때 호출
+def warn_if_ingest_cache_is_local(process):
+    if not cache_is_shared():
+        warn_once(f"{process} 의 캐시 무효화가 웹 프로세스에 전달되지 않습니다. "
+                  f"CACHES 가 프로세스 로컬({settings.CACHES['default']['BACKEND']}) 입니다. REDIS_URL 을 설정하세요")
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if cache_is_shared():
+        return []
+    return [checks.Warning(
+        "CACHES['default'] 가 프로세스 로컬 캐시입니다.",
+        hint="수집은 cli_collect.py 등 다른 프로세스에서 하므로 웹 프로세스의 출석부 캐시가 무효화되지 않습니다. REDIS_URL 을 설정하세요.",
+        id="attendance.W001",
+    )]
@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 출석부 캐시(Django cache) 를 쓰기 때문에 Django 설정을 먼저 불러옴
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+django.setup()
+
+from attendance import archive
+from attendance.garden import Garden
+
+# 끝난 시즌을 ARCHIVE_DIR/<slug>/ 에 Parquet 로 보관. --purge 면 보관한 기간의 메시지를 DB 에서 지움
+#
+#     python attendance/cli_archive.py garden3 [--purge]
+args = [arg for arg in sys.argv[1:] if arg != "--purge"]
+if not args:
+    sys.exit("usage: cli_archive.py <slug> [--purge]")
+
+garden = Garden(args[0])
+manifest = archive.write_season(garden)
+print(f"[{garden.slug}] archived {manifest['messages']} messages, {manifest['commits']} commits "
+      f"({manifest['from']} ~ {manifest['until']}) -> {archive.archive_path(garden)}")
+
+if "--purge" in sys.argv:
+    deleted = archive.purge_season(garden, archive.read_manifest(garden))
+    print(f"[{garden.slug}] purged {deleted} messages")
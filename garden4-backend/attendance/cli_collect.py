@@ -1,13 +1,40 @@
-from garden import Garden
-from datetime import date, datetime, timedelta
+import os
+import sys
+import traceback
 
-garden = Garden()
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-today = datetime.today()
-yesterday = today - timedelta(days=1)
-tomorrow = today + timedelta(days=1)
+# 출석부 캐시(Django cache) 를 쓰기 때문에 Django 설정을 먼저 불러옴
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+django.setup()
 
-oldest = yesterday.timestamp()
-latest = tomorrow.timestamp()
+from attendance import scheduler
+from attendance.checks import warn_if_ingest_cache_is_local
+from attendance.garden import Garden, garden_slugs
 
-garden.collect_slack_messages(oldest, latest)
\ No newline at end of file
+# 설정된 모든 정원의 채널을 차례로 수집. 한 정원이 실패해도 나머지는 계속함
+# 계속 띄워두고 주기적으로 수집하려면 python manage.py garden_scheduler
+warn_if_ingest_cache_is_local("cli_collect.py")
+failed = []
+for slug in garden_slugs():
+    try:
+        garden = Garden(slug)
+        # Slack 호출 카운터는 토큰 단위(정원끼리 같은 토큰이면 공유)라서 이 정원이 수집하는 동안 늘어난 만큼만 출력
+        before = garden.slack_client.get_stats()
+
+        # 마지막으로 저장한 메시지 이후만 수집 (첫 실행은 어제부터). 필요하면 정적 snapshot 갱신
+        result = scheduler.collect(garden)
+        print(f"[{slug}] collected {result['messages']} messages")
+        if result["snapshot"]:
+            print(f"[{slug}] published snapshot {result['snapshot']}")
+
+        after = garden.slack_client.get_stats()
+        used = {name: round(after[name] - before[name], 3) for name in after}
+        print(f"[{slug}] slack {used}")
+    except Exception:
+        traceback.print_exc()
+        failed.append(slug)
+
+if failed:
+    sys.exit(f"failed: {', '.join(failed)}")
@@ -0,0 +1,49 @@
+import glob
+import os
+import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Garden 이 출석부 캐시(Django cache) 를 쓰기 때문에 Django 설정을 먼저 불러옴
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+django.setup()
+
+from attendance.garden import Garden
+
+# 새 정원의 스키마를 만든다. 기본 테이블(archive/migration/supabase_schema.sql) 과 sql/ 의 추가 스키마를
+# garden4 대신 그 정원의 스키마(SCHEMA, 기본은 slug) 로 바꿔서 순서대로 실행함
+#
+#     python attendance/cli_create_schema.py garden3 [--no-rls]
+#
+# --no-rls: Supabase 가 아닌 PostgreSQL 에서는 auth.role() 이 없으므로 RLS 정책을 빼고 만듦
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_PATH = os.path.join(BACKEND_DIR, 'archive', 'migration', 'supabase_schema.sql')
+SQL_DIR = os.path.join(BACKEND_DIR, 'sql')
+
+
+def read_sql(path):
+    with open(path, encoding='utf-8') as file:
+        return file.read()
+
+
+args = [arg for arg in sys.argv[1:] if arg != "--no-rls"]
+if not args:
+    sys.exit("usage: cli_create_schema.py <slug> [--no-rls]")
+
+garden = Garden(args[0])
+
+base_sql = read_sql(SCHEMA_PATH)
+if "--no-rls" in sys.argv:
+    base_sql = base_sql.split('-- RLS')[0]
+
+paths = sorted(glob.glob(os.path.join(SQL_DIR, '*.sql')))
+conn = garden.connect_postgres()
+cursor = conn.cursor()
+for (name, sql) in [("supabase_schema.sql", base_sql)] + [(os.path.basename(path), read_sql(path)) for path in paths]:
+    print(f"[{garden.slug}] apply {name}")
+    cursor.execute(re.sub(r'\bgarden4\b', garden.pg_schema, sql))
+    conn.commit()
+cursor.close()
+conn.close()
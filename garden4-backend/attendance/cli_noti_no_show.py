@@ -1,6 +1,15 @@
-from garden import Garden
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 출석부 캐시(Django cache) 를 쓰기 때문에 Django 설정을 먼저 불러옴
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+django.setup()
+
+from attendance.garden import Garden
 from datetime import date, datetime, timedelta
-import slack
 
 garden = Garden()
 
@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 페이지/API 를 Django view 로 렌더링하므로 Django 설정을 먼저 불러옴
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+django.setup()
+
+from attendance import snapshot
+from attendance.garden import Garden, garden_slugs
+
+# 정원 slug 를 인자로 주면 그 정원만, 없으면 모든 정원
+slugs = sys.argv[1:] or garden_slugs()
+
+for slug in slugs:
+    garden = Garden(slug)
+    if not garden.snapshot_dir:
+        sys.exit("SNAPSHOT_DIR is not set")
+
+    version = snapshot.publish(garden, garden.snapshot_dir)
+    print(f"[{slug}] published snapshot {version} -> {os.path.join(garden.snapshot_dir, 'current')}")
@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 수집 후 출석부 캐시(Django cache) 무효화, snapshot 렌더링에 Django 설정이 필요함
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+django.setup()
+
+from attendance import jobs
+from attendance.checks import warn_if_ingest_cache_is_local
+from attendance.garden import Garden
+
+# 동시 처리 수는 JOB_WORKERS 설정 또는 첫 번째 인자. --once 면 대기 중인 작업만 처리하고 종료
+args = [arg for arg in sys.argv[1:] if arg != "--once"]
+concurrency = int(args[0]) if args else Garden().job_workers
+
+warn_if_ingest_cache_is_local("cli_worker.py")
+print(f"job worker started (concurrency={concurrency})")
+jobs.run_workers(concurrency=concurrency, once="--once" in sys.argv)
@@ -0,0 +1,50 @@
+import json
+import os
+from datetime import datetime, timezone
+
+# mongoexport 로 만든 시즌4 slack_messages 덤프 (MongoDB Extended JSON, 한 줄에 한 document)
+DEFAULT_DUMP_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'archive', '20250622_mongodb_dump', 'garden', 'slack_messages.json'
+)
+
+
+def parse_extended_json(value):
+    """
+    {"$numberInt": "1"}, {"$date": {"$numberLong": "..."}} 같은 Extended JSON 값을 파이썬 값으로 변환
+    $date 는 naive UTC datetime 으로 바꾼다 (slack_messages.ts_for_db 와 같은 형태)
+    """
+    if isinstance(value, list):
+        return [parse_extended_json(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    if len(value) == 1:
+        (key, inner) = next(iter(value.items()))
+        if key in ('$numberInt', '$numberLong'):
+            return int(inner)
+        if key == '$numberDouble':
+            return float(inner)
+        if key == '$oid':
+            return inner
+        if key == '$date':
+            millis = int(inner['$numberLong']) if isinstance(inner, dict) else inner
+            if isinstance(millis, str):
+                return datetime.fromisoformat(millis.replace('Z', '+00:00')).replace(tzinfo=None)
+            return datetime.fromtimestamp(millis / 1000, timezone.utc).replace(tzinfo=None)
+
+    return {key: parse_extended_json(inner) for (key, inner) in value.items()}
+
+
+def read_dump(path=DEFAULT_DUMP_PATH):
+    """
+    덤프 파일을 한 줄씩 읽어서 slack message dict 를 돌려줌 (_id 제외)
+    """
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            document = parse_extended_json(json.loads(line))
+            document.pop('_id', None)
+            yield document
@@ -1,26 +1,105 @@
 import configparser
-from datetime import date, timedelta, datetime
-from slack_sdk import WebClient
+import csv
+import io
+from datetime import date, time, timedelta, datetime
+from decimal import Decimal
 import psycopg2
 import psycopg2.extras
+import heapq
+import itertools
 import json
 import pprint
 import os
 import yaml
 import pytz
+import re
+
+from django.core.cache import cache
+
+from . import archive, live, postgres
+from .attendance_cache import AttendanceCache
+from .checks import cache_is_shared, warn_once
+from .slack_client import GardenSlackClient
+
+# attachment footer 에서 저장소 이름 추출
+# <https://github.com/lumiamitie/TIL|lumiamitie/TIL> -> lumiamitie/TIL
+def parse_repository(footer):
+    if not footer:
+        return None
+    match = re.search(r'\|([^>]+)>', footer)
+    return match.group(1) if match else footer
+
+
+# slack_messages.attachments 에 남기는 필드. 나머지(author_icon, color 등)는 slack_message_raw 에만 저장
+ATTACHMENT_FIELDS = ('author_name', 'text', 'footer', 'pretext', 'title', 'title_link')
+
+# slack_message_raw 에서 빼는 필드. slack_messages 의 컬럼이나 bot_profiles 에 저장됨
+RAW_EXCLUDED_FIELDS = ('ts', 'text', 'user', 'bot_id', 'team', 'type', 'bot_profile')
+
+
+def compact_attachments(attachments):
+    if not attachments:
+        return None
+    return [
+        {key: attachment[key] for key in ATTACHMENT_FIELDS if attachment.get(key) is not None}
+        for attachment in attachments
+    ]
+
+
+# config.ini 의 [GARDEN:<slug>] 섹션 하나가 정원(시즌/채널) 하나
+GARDEN_SECTION_PREFIX = 'GARDEN:'
+
+
+class GardenNotFound(Exception):
+    pass
+
+
+def read_config():
+    config = configparser.ConfigParser()
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    # config.ini, users.yaml 위치. 부하 테스트 등에서 다른 설정을 쓸 때 GARDEN_CONFIG_DIR 로 바꿈
+    CONFIG_DIR = os.getenv('GARDEN_CONFIG_DIR', BASE_DIR)
+    path = os.path.join(CONFIG_DIR, 'config.ini')
+    config.read(path)
+    return (config, CONFIG_DIR)
+
+
+def default_garden_slug(config):
+    # 기본 정원([DEFAULT], [GITHUB], users.yaml) 의 slug. 없으면 스키마 이름
+    return os.getenv('GARDEN_SLUG', config['DEFAULT'].get('SLUG', os.getenv('DB_SCHEMA', config['POSTGRESQL']['SCHEMA'])))
+
+
+# 서비스하는 정원 slug 목록. 첫번째가 기본 정원
+def garden_slugs():
+    (config, _) = read_config()
+    slugs = [default_garden_slug(config)]
+    for section in config.sections():
+        if section.startswith(GARDEN_SECTION_PREFIX) and section[len(GARDEN_SECTION_PREFIX):] not in slugs:
+            slugs.append(section[len(GARDEN_SECTION_PREFIX):])
+    return slugs
+
 
 class Garden:
-    def __init__(self):
-        config = configparser.ConfigParser()
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        path = os.path.join(BASE_DIR, 'config.ini')
-        config.read(path)
+    """
+    정원 하나(시즌/채널)의 출석부
+    slug 가 없으면 기본 정원, 있으면 config.ini 의 [GARDEN:<slug>] 섹션을 읽음. 없는 정원이면 GardenNotFound
+    Slack 토큰, DB 접속 정보 등은 모든 정원이 같이 쓰고, 데이터는 정원별 스키마에 저장됨
+    """
+    def __init__(self, slug=None):
+        (config, CONFIG_DIR) = read_config()
 
         # Use environment variables if available, otherwise fallback to config file
         slack_api_token = os.getenv('SLACK_API_TOKEN', config['DEFAULT']['SLACK_API_TOKEN'])
-        self.slack_client = WebClient(token=slack_api_token)
-
-        self.channel_id = os.getenv('CHANNEL_ID', config['DEFAULT']['CHANNEL_ID'])
+        slack_client_kwargs = {}
+        # 로컬 Slack emulator(loadtest/slack_emulator.py) 등 다른 주소를 쓸 때
+        slack_api_base_url = os.getenv('SLACK_API_BASE_URL', config['DEFAULT'].get('SLACK_API_BASE_URL'))
+        if slack_api_base_url:
+            slack_client_kwargs['base_url'] = slack_api_base_url
+        self.slack_client = GardenSlackClient(
+            token=slack_api_token,
+            max_retries=int(os.getenv('SLACK_MAX_RETRIES', config['DEFAULT'].get('SLACK_MAX_RETRIES', '5'))),
+            **slack_client_kwargs
+        )
 
         # PostgreSQL settings - prioritize environment variables
         self.pg_database = os.getenv('DB_NAME', config['POSTGRESQL']['DATABASE'])
@@ -28,38 +107,147 @@ class Garden:
         self.pg_port = os.getenv('DB_PORT', config['POSTGRESQL']['PORT'])
         self.pg_user = os.getenv('DB_USER', config['POSTGRESQL']['USER'])
         self.pg_password = os.getenv('DB_PASSWORD', config['POSTGRESQL']['PASSWORD'])
-        self.pg_schema = os.getenv('DB_SCHEMA', config['POSTGRESQL']['SCHEMA'])
-
-        self.gardening_days = os.getenv('GARDENING_DAYS', config['DEFAULT']['GARDENING_DAYS'])
-
-        # users list ['junho85', 'user2', 'user3']
-        self.users = config['GITHUB']['USERS'].split(',')
+        # 로컬 PostgreSQL 처럼 SSL 이 없는 경우 disable
+        self.pg_sslmode = os.getenv('DB_SSLMODE', config['POSTGRESQL'].get('SSLMODE', 'require'))
+        # 전체 이력을 훑는 쿼리(stream)에서 서버 cursor 로부터 한 번에 가져올 row 수
+        self.pg_itersize = int(os.getenv('DB_ITERSIZE', config['POSTGRESQL'].get('ITERSIZE', '2000')))
+        # connection pool (attendance/postgres.py). 쉬는 연결을 남겨둘 수, 동시에 빌려줄 최대 수
+        self.pg_pool_size = int(os.getenv('DB_POOL_SIZE', config['POSTGRESQL'].get('POOL_SIZE', '2')))
+        self.pg_pool_max_size = int(os.getenv('DB_POOL_MAX_SIZE', config['POSTGRESQL'].get('POOL_MAX_SIZE', '20')))
+        # 읽기 전용 replica. "host[:port],host[:port]" 형식, 없으면 모든 쿼리를 primary(HOST) 로 보냄
+        replica_hosts = os.getenv('DB_REPLICA_HOSTS', config['POSTGRESQL'].get('REPLICA_HOSTS', ''))
+        self.pg_replicas = [
+            (host, port or self.pg_port)
+            for (host, _, port) in (item.strip().partition(':') for item in replica_hosts.split(',') if item.strip())
+        ]
+        # 수집한 프로세스가 쓴 WAL 위치를 Django cache 로 웹 프로세스에 전달하므로(mark_written) 공유 캐시가 없으면
+        # read-your-writes 를 지킬 수 없음. 이 때는 replica 를 쓰지 않음
+        if self.pg_replicas and not cache_is_shared():
+            warn_once("REPLICA_HOSTS 는 공유 캐시(REDIS_URL)가 있어야 사용합니다. 모든 쿼리를 primary 로 보냅니다")
+            self.pg_replicas = []
+
+        # 증분 수집시 watermark 이전으로 겹쳐서 가져올 시간(초). 늦게 수정된 메시지 반영용
+        self.collect_overlap_seconds = int(os.getenv('COLLECT_OVERLAP_SECONDS', config['DEFAULT'].get('COLLECT_OVERLAP_SECONDS', '300')))
+
+        # 끝난 시즌 보관본(attendance/archive.py) 디렉토리. 정원별로 <ARCHIVE_DIR>/<slug>/
+        self.archive_dir = os.getenv('ARCHIVE_DIR', config['DEFAULT'].get('ARCHIVE_DIR'))
+
+        # 정적 snapshot(attendance/snapshot.py) 을 만들 디렉토리. 없으면 만들지 않음
+        self.snapshot_dir = os.getenv('SNAPSHOT_DIR', config['DEFAULT'].get('SNAPSHOT_DIR'))
+
+        # 백그라운드 작업(attendance/jobs.py) 을 동시에 처리할 worker thread 수
+        self.job_workers = int(os.getenv('JOB_WORKERS', config['DEFAULT'].get('JOB_WORKERS', '2')))
+
+        # scheduler(python manage.py garden_scheduler) 수집 간격(초), 상태 확인용 HTTP 주소
+        self.scheduler_interval = int(os.getenv('SCHEDULER_INTERVAL', config['DEFAULT'].get('SCHEDULER_INTERVAL', '60')))
+        self.scheduler_bind = os.getenv('SCHEDULER_BIND', config['DEFAULT'].get('SCHEDULER_BIND', '127.0.0.1:8005'))
+
+        # 아바타 캐시(attendance/avatars.py) 디렉토리. 없으면 GitHub 주소로 redirect. 모든 정원이 같이 씀
+        self.avatar_dir = os.getenv('AVATAR_DIR', config['DEFAULT'].get('AVATAR_DIR'))
+        self.avatar_origin = os.getenv('AVATAR_ORIGIN', config['DEFAULT'].get('AVATAR_ORIGIN', 'https://avatars.githubusercontent.com/'))
+        # 받은 지 이 시간(초)이 지나면 뒤에서 다시 받음
+        self.avatar_max_age = int(os.getenv('AVATAR_MAX_AGE', config['DEFAULT'].get('AVATAR_MAX_AGE', '86400')))
+
+        # 원본 메시지(축소 전 attachments, reactions 등)를 slack_message_raw 에 보관할지
+        self.store_raw_payload = os.getenv('STORE_RAW_PAYLOAD', config['DEFAULT'].get('STORE_RAW_PAYLOAD', 'true')).lower() == 'true'
+        # (bot_id, team, type, bot_profile) -> bot_profiles.id
+        self.bot_profile_ids = {}
+
+        default_slug = default_garden_slug(config)
+        self.slug = slug or default_slug
+        self.is_default = self.slug == default_slug
+
+        if self.is_default:
+            self.channel_id = os.getenv('CHANNEL_ID', config['DEFAULT']['CHANNEL_ID'])
+            self.pg_schema = os.getenv('DB_SCHEMA', config['POSTGRESQL']['SCHEMA'])
+            self.gardening_days = os.getenv('GARDENING_DAYS', config['DEFAULT']['GARDENING_DAYS'])
+            start_date = config['DEFAULT']['START_DATE']
+            # users list ['junho85', 'user2', 'user3']
+            self.users = config['GITHUB']['USERS'].split(',')
+            users_file = 'users.yaml'
+            no_show_time = os.getenv('NO_SHOW_TIME', config['DEFAULT'].get('NO_SHOW_TIME'))
+        else:
+            section_name = GARDEN_SECTION_PREFIX + self.slug
+            if not config.has_section(section_name):
+                raise GardenNotFound(self.slug)
+            # 섹션에 없는 값은 [DEFAULT] 를 따름
+            section = config[section_name]
+            self.channel_id = section['CHANNEL_ID']
+            self.pg_schema = section.get('SCHEMA', self.slug)
+            self.gardening_days = section['GARDENING_DAYS']
+            start_date = section['START_DATE']
+            self.users = section['USERS'].split(',')
+            users_file = section.get('USERS_FILE', f'users_{self.slug}.yaml')
+            no_show_time = section.get('NO_SHOW_TIME')
+            # 정원별 snapshot 은 SNAPSHOT_DIR/<slug>/ 아래
+            if self.snapshot_dir:
+                self.snapshot_dir = os.path.join(self.snapshot_dir, self.slug)
 
         # users_with_slackname
-        path = os.path.join(BASE_DIR, 'users.yaml')
+        path = os.path.join(CONFIG_DIR, users_file)
 
         with open(path) as file:
             self.users_with_slackname = yaml.safe_load(file)
 
-        self.start_date = datetime.strptime(config['DEFAULT']['START_DATE'], "%Y-%m-%d").date()  # start_date e.g.) 2019-10-01
+        self.start_date = datetime.strptime(start_date, "%Y-%m-%d").date()  # start_date e.g.) 2019-10-01
+        # 미출석자 알림 시각 (KST, HH:MM). 없으면 scheduler 가 보내지 않음
+        self.no_show_time = datetime.strptime(no_show_time, "%H:%M").time() if no_show_time else None
         
         # 타임존 설정
         self.kst = pytz.timezone('Asia/Seoul')
 
-    def connect_postgres(self):
-        conn = psycopg2.connect(
-            host=self.pg_host,
-            port=self.pg_port,
-            database=self.pg_database,
-            user=self.pg_user,
-            password=self.pg_password,
-            sslmode='require'
-        )
-        # 연결 후 스키마 설정
-        cursor = conn.cursor()
-        cursor.execute(f"SET search_path TO {self.pg_schema}")
-        cursor.close()
-        return conn
+        self.attendance_cache = AttendanceCache(self)
+
+    # primary(HOST) 접속 정보 (psycopg2.connect 인자)
+    def pg_params(self):
+        return {
+            "host": self.pg_host,
+            "port": self.pg_port,
+            "database": self.pg_database,
+            "user": self.pg_user,
+            "password": self.pg_password,
+            "sslmode": self.pg_sslmode,
+        }
+
+    """
+    pool 에서 connection 을 빌려옴. search_path 는 이 정원의 스키마. 다 쓰면 conn.close() 로 돌려줌
+    readonly 면 replica 에서 빌려옴. 마지막 수집 내용이 아직 반영되지 않았거나 replica 가 모두 안 되면 primary
+    """
+    def connect_postgres(self, readonly=False):
+        params = self.pg_params()
+        if readonly and self.pg_replicas:
+            conn = postgres.connect_replica(self.pg_replicas, self.pg_schema, self.pg_pool_size, self.pg_pool_max_size,
+                                            min_lsn=cache.get(self.written_lsn_key()), **params)
+            if conn is not None:
+                return conn
+        return postgres.connect(self.pg_schema, self.pg_pool_size, self.pg_pool_max_size, **params)
+
+    # primary 에 마지막으로 쓴 WAL 위치. 모든 정원이 같은 primary 를 쓰므로 host 단위
+    def written_lsn_key(self):
+        return f"garden4:postgres:{self.pg_host}:{self.pg_port}:written_lsn"
+
+    # 쓰기를 commit 한 뒤 호출. replica 가 여기까지 반영하기 전에는 읽기도 primary 에서 함 (read-your-writes)
+    def mark_written(self, cursor):
+        if not self.pg_replicas:
+            return
+        cursor.execute("SELECT pg_current_wal_lsn()")
+        cache.set(self.written_lsn_key(), postgres.lsn_value(cursor.fetchone()[0]), timeout=None)
+
+    """
+    서버 쪽 cursor(named cursor) 로 쿼리 결과를 itersize 개씩 가져오면서 row 를 하나씩 돌려줌
+    결과 전체를 메모리에 올리지 않으므로 전체 이력을 훑는 쿼리에 사용
+    """
+    def stream(self, query, params=None, cursor_factory=None):
+        conn = self.connect_postgres(readonly=True)
+        # named cursor 는 트랜잭션 안에서만 유효. 읽기만 하므로 끝나면 그대로 닫음
+        cursor = conn.cursor(name="garden4_stream", cursor_factory=cursor_factory)
+        cursor.itersize = self.pg_itersize
+        try:
+            cursor.execute(query, params)
+            yield from cursor
+        finally:
+            cursor.close()
+            conn.close()
 
     def get_member(self):
         return self.users
@@ -73,144 +261,554 @@ class Garden:
     def get_members(self):
         return self.users_with_slackname
 
+    # oldest ~ latest(unix time) 사이 메시지의 ts, datetime(KST). 한 row 씩 읽음
     def find_attend(self, oldest, latest):
-        print("find_attend")
-        print(oldest)
-        print(datetime.fromtimestamp(oldest))
-        print(latest)
-        print(datetime.fromtimestamp(latest))
-
-        conn = self.connect_postgres()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
         query = """
-            SELECT ts, ts_for_db
+            SELECT ts, ts_at AT TIME ZONE 'Asia/Seoul' AS datetime
             FROM slack_messages 
-            WHERE ts_for_db >= %s AND ts_for_db < %s
+            WHERE ts_at >= to_timestamp(%s) AND ts_at < to_timestamp(%s)
         """
         
-        cursor.execute(query, (datetime.fromtimestamp(oldest), datetime.fromtimestamp(latest)))
-        messages = cursor.fetchall()
+        return self.stream(query, (oldest, latest), cursor_factory=psycopg2.extras.RealDictCursor)
 
-        for message in messages:
-            print(message["ts"])
-            print(message)
+    # 특정 유저의 전체 출석부를 생성함
+    # since(KST) 가 있으면 그 이후 메시지만 읽어서 result 에 이어 붙인다
+    def find_attendance_by_user(self, user, since=None, result=None):
+        if result is None:
+            result = {}
+        return self.build_attendance(self.iter_attends_by_user(user, since), result)
+
+    # 유저의 출석(메시지) 을 ts 순서로 하나씩 돌려줌
+    # (gardening_date, {"ts": KST datetime, "message": [커밋 메시지, ...]}). gardening_date 는 새벽 4시 기준 날짜
+    def iter_attends_by_user(self, user, since=None):
+        manifest = archive.read_manifest(self)
+        attends = self.iter_db_attends_by_user(user, since, manifest)
+        if manifest is None:
+            return attends
+        # 보관된 시즌은 Parquet 에서 읽어서 DB 와 ts 순서로 합침
+        return heapq.merge(archive.iter_attends_by_user(self, user, since), attends, key=lambda item: item[1]["ts"])
+
+    # DB 에 있는 출석. manifest(보관본) 가 있으면 보관된 기간은 뺌
+    def iter_db_attends_by_user(self, user, since=None, manifest=None):
+        # JSONB 배열에서 author_name이 일치하는 메시지를 찾고(@>, GIN 인덱스),
+        # attachment 도 SQL 에서 풀어서 그 유저의 커밋 메시지(text)만 가져옴
+        # ts_at 을 KST 로 바꿔서 받음 (timezone 없는 datetime). 출석 날짜는 저장할 때 계산한 gardening_date 를 씀
+        query = """
+            SELECT sm.ts, sm.ts_at AT TIME ZONE 'Asia/Seoul', sm.gardening_date, COALESCE(a.attachment->>'text', '')
+            FROM slack_messages sm
+            CROSS JOIN LATERAL jsonb_array_elements(sm.attachments) WITH ORDINALITY AS a(attachment, idx)
+            WHERE sm.attachments @> %s
+              AND a.attachment->>'author_name' = %s
+        """
+        
+        # JSONB 쿼리 파라미터
+        param = json.dumps([{"author_name": user}])
+        params = [param, user]
 
-        cursor.close()
-        conn.close()
+        if since is not None:
+            query += " AND sm.ts_at >= %s"
+            params.append(self.kst.localize(since))
 
-    # 특정 유저의 전체 출석부를 생성함
-    # TODO 출석부를 DB에 넣고 마지막 생성된 출석부 이후의 데이터로 추가 출석부 만들도록 하자
-    def find_attendance_by_user(self, user):
-        conn = self.connect_postgres()
+        if manifest is not None:
+            (condition, condition_params) = archive.exclude_archived_sql(self, manifest, "sm.ts_at")
+            query += condition
+            params += condition_params
+
+        query += " ORDER BY sm.ts, a.idx"
+
+        # row 는 (ts, KST datetime, gardening_date, text). 메시지 하나에 그 유저의 attachment 가 여러개면 같은 ts 로 여러 row
+        rows = self.stream(query, params)
+        for ((ts, ts_datetime, gardening_date), message_rows) in itertools.groupby(rows, key=lambda row: row[:3]):
+            commits = [text for (_, _, _, text) in message_rows]
+            yield (gardening_date, {"ts": ts_datetime, "message": commits})
+
+    # 출석들을 날짜별로 모음. 새벽 4시 전 출석은 전날 출석이 없을때만 전날로 침
+    # attends 는 (gardening_date, attend). 새벽 4시 전 출석의 gardening_date 는 이미 전날임
+    def build_attendance(self, attends, result):
+        start_date = self.start_date
+
+        for (date, attend) in attends:
+            # 전날이 이미 출석했거나 시즌 전이면 그 날(달력 날짜)로 침
+            if attend["ts"].hour < 4 and (date in result or date < start_date):
+                date += timedelta(days=1)
+
+            if date not in result:
+                result[date] = []
+            result[date].append(attend)
+
+        return result
+
+    # 특정 유저의 커밋 내역. ts 기준 최신순, before 보다 이전 것만 limit 개 (keyset pagination)
+    def find_commits_by_user(self, user, before=None, limit=50):
+        conn = self.connect_postgres(readonly=True)
         cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-        # PostgreSQL 쿼리: JSONB 배열에서 author_name이 일치하는 메시지 찾기
         query = """
-            SELECT ts, ts_for_db, attachments
-            FROM slack_messages 
+            SELECT ts, ts_at AT TIME ZONE 'Asia/Seoul' AS datetime, attachments
+            FROM slack_messages
             WHERE attachments @> %s
-            ORDER BY ts
         """
-        
-        # JSONB 쿼리 파라미터
-        param = json.dumps([{"author_name": user}])
-        
-        cursor.execute(query, (param,))
+        params = [json.dumps([{"author_name": user}])]
+
+        if before is not None:
+            query += " AND ts < %s"
+            params.append(before)
+
+        manifest = archive.read_manifest(self)
+        if manifest is not None:
+            (condition, condition_params) = archive.exclude_archived_sql(self, manifest)
+            query += condition
+            params += condition_params
+
+        # ts unique index 를 역순으로 타면서 limit 개만 읽음
+        query += " ORDER BY ts DESC LIMIT %s"
+        params.append(limit)
+
+        cursor.execute(query, params)
         messages = cursor.fetchall()
 
-        result = {}
-        start_date = self.start_date
-        
+        commits = []
         for message in messages:
-            # make attend
-            commits = []
-            attachments = message['attachments']
-            if attachments:
-                for attachment in attachments:
-                    if attachment.get('author_name') == user:
-                        commits.append(attachment.get('text', ''))
-            
-            # DB의 ts_for_db는 KST 시간이 UTC로 저장되어 있으므로 9시간을 빼서 올바른 KST로 변환
-            ts_datetime_raw = message['ts_for_db']
-            ts_datetime = ts_datetime_raw - timedelta(hours=9)
-            attend = {"ts": ts_datetime, "message": commits}
-
-            # current date and date before day1
-            date = ts_datetime.date()
-            date_before_day1 = date - timedelta(days=1)
-            hour = ts_datetime.hour
-
-            if date_before_day1 >= start_date and hour < 4 and date_before_day1 not in result:
-                # check before day1. if exists, before day1 is already done.
-                result[date_before_day1] = []
-                result[date_before_day1].append(attend)
-            else:
-                # create date commits array
-                if date not in result:
-                    result[date] = []
-
-                result[date].append(attend)
+            texts = [
+                attachment.get('text', '')
+                for attachment in message['attachments']
+                if attachment.get('author_name') == user
+            ]
+            commits.append({"ts": message['ts'], "datetime": message['datetime'], "message": texts})
+
+        # 보관된 시즌의 커밋과 합쳐서 최신순 limit 개
+        if manifest is not None:
+            commits = sorted(commits + archive.commits_by_user(self, user, before, limit), key=lambda commit: commit["ts"], reverse=True)[:limit]
 
         cursor.close()
         conn.close()
-        return result
+        return commits
+
+    # 특정 유저의 전체 출석부. 캐시에 없을때만 find_attendance_by_user 로 계산함
+    def get_attendance_by_user(self, user):
+        return self.attendance_cache.get(user)
+
+    # 유저별 출석일수, 출석률, 순위, 연속 출석일, 미출석일
+    def get_stats(self):
+        stats = self.attendance_cache.get_stats()
+        return sorted(stats.values(), key=lambda member: (member.rank, member.user))
+
+    # 출석 판정 기준의 "오늘". 새벽 4시 전까지는 전날로 본다
+    def get_gardening_date(self, now=None):
+        if now is None:
+            now = datetime.now(self.kst).replace(tzinfo=None)
+        return (now - timedelta(hours=4)).date()
 
     # github 봇으로 모은 slack message 들을 slack_messages 테이블에 저장
     def collect_slack_messages(self, oldest, latest):
-        response = self.slack_client.conversations_history(
+        # 한 프로세스 안에서 같은 구간 수집이 동시에 들어오면 Slack 호출은 한 번만 일어나고 결과를 공유함
+        # Slack 에서 다 받을 때까지(재시도, Retry-After 포함) DB 연결과 lock 은 잡지 않음
+        messages = self.slack_client.conversations_history_all(
+            channel=self.channel_id,
+            oldest=oldest,
+            latest=latest,
+        )
+
+        conn = self.connect_postgres()
+        cursor = conn.cursor()
+        self.lock_collection(cursor)
+        bot_profile_ids = self.insert_slack_messages(cursor, messages)
+
+        conn.commit()
+        self.bot_profile_ids.update(bot_profile_ids)
+        self.mark_written(cursor)
+        cursor.close()
+        conn.close()
+
+        self.attendance_cache.invalidate(messages)
+        self.record_attendance_changes(self.message_authors(messages))
+        return len(messages)
+
+    """
+    마지막으로 저장한 ts(watermark) 이후의 메시지만 수집
+    watermark 가 없으면(첫 실행) 어제부터 수집한다.
+    수정된 메시지를 잡기 위해 collect_overlap_seconds 만큼 겹쳐서 가져오고,
+    겹친 구간의 메시지는 edited 된 것만 갱신한다.
+    watermark 를 읽고 lock 없이 Slack 에서 받은 뒤, lock 을 잡고 그 사이 watermark 가 그대로일 때만 저장하고 올린다.
+    """
+    def collect_new_slack_messages(self):
+        watermark = self.get_watermark()
+        if watermark is None:
+            # 초 단위로 맞춰서 동시에 시작한 첫 수집도 같은 구간이 되게 함
+            oldest = int((datetime.today() - timedelta(days=1)).timestamp())
+        else:
+            oldest = float(watermark) - self.collect_overlap_seconds
+
+        # 같은 watermark 로 동시에 수집하면 같은 구간이므로 Slack 호출은 한 번 (single-flight)
+        messages = self.slack_client.conversations_history_all(
             channel=self.channel_id,
-            latest=str(latest),
-            oldest=str(oldest),
-            limit=1000
+            oldest=oldest,
+            latest=None,
         )
 
+        if watermark is not None:
+            messages = [
+                message for message in messages
+                if Decimal(message["ts"]) > watermark or "edited" in message
+            ]
+
         conn = self.connect_postgres()
         cursor = conn.cursor()
+        self.lock_collection(cursor)
+        if self.get_watermark(cursor) != watermark:
+            # 기다리는 동안 다른 수집기가 저장하고 watermark 를 올렸음. 남은 메시지는 다음 수집에서 가져옴
+            conn.rollback()
+            cursor.close()
+            conn.close()
+            return 0
+
+        bot_profile_ids = self.insert_slack_messages(cursor, messages)
+
+        if messages:
+            # insert 와 같은 트랜잭션에서 watermark 를 올림
+            cursor.execute("""
+                INSERT INTO collect_watermarks (channel_id, last_ts, updated_at)
+                VALUES (%s, %s, NOW())
+                ON CONFLICT (channel_id) DO UPDATE
+                SET last_ts = GREATEST(collect_watermarks.last_ts, EXCLUDED.last_ts),
+                    updated_at = NOW()
+            """, (self.channel_id, max(Decimal(message["ts"]) for message in messages)))
+
+        conn.commit()
+        self.bot_profile_ids.update(bot_profile_ids)
+        if messages:
+            self.mark_written(cursor)
+        cursor.close()
+        conn.close()
+
+        self.attendance_cache.invalidate(messages)
+        if messages:
+            self.record_attendance_changes(self.message_authors(messages))
+
+        return len(messages)
+
+    # 채널의 watermark. 없으면 None. cursor 가 없으면 새 연결에서 읽고 바로 돌려줌
+    def get_watermark(self, cursor=None):
+        if cursor is None:
+            conn = self.connect_postgres()
+            cursor = conn.cursor()
+            try:
+                return self.get_watermark(cursor)
+            finally:
+                conn.rollback()
+                cursor.close()
+                conn.close()
 
-        for message in response["messages"]:
-            ts_for_db = datetime.fromtimestamp(float(message["ts"]))
-            
-            # PostgreSQL INSERT 쿼리
-            insert_query = """
-                INSERT INTO slack_messages (
-                    ts, ts_for_db, bot_id, type, text, "user", team, 
-                    bot_profile, attachments
-                ) VALUES (
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s
-                ) ON CONFLICT (ts) DO NOTHING
-            """
-            
+        cursor.execute("SELECT last_ts FROM collect_watermarks WHERE channel_id = %s", (self.channel_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    """
+    채널에 저장하는 수집은 프로세스가 달라도 한 번에 하나씩 (트랜잭션이 끝나면 풀림)
+    Slack 에서 받는 동안이 아니라 받은 뒤 저장할 때만 잡는다.
+    GardenSlackClient 의 single-flight 는 프로세스 안에서만 같은 구간 요청을 합치므로 다른 프로세스(scheduler, worker)는 따로 받고,
+    같은 구간의 수동 수집(/collect) 은 작업 큐에서 하나로 합쳐짐 (jobs.enqueue)
+    """
+    def lock_collection(self, cursor):
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"garden4.collect.{self.channel_id}",))
+
+    def insert_slack_messages(self, cursor, messages):
+        # edited 메시지는 이미 저장되어 있을 수 있으므로 내용을 갱신
+        insert_query = """
+            INSERT INTO slack_messages (
+                ts, ts_at, gardening_date, ts_for_db, text, "user", bot_profile_id, attachments
+            ) VALUES (
+                %s, %s, %s, %s, %s, %s, %s, %s
+            ) ON CONFLICT (ts) DO NOTHING
+            RETURNING (xmax = 0) AS inserted
+        """
+        upsert_query = insert_query.replace(
+            "DO NOTHING",
+            "DO UPDATE SET text = EXCLUDED.text, attachments = EXCLUDED.attachments"
+        )
+        # 이 트랜잭션에서 새로 받은 bot_profiles.id. commit 된 뒤에 self.bot_profile_ids 에 넣음
+        bot_profile_ids = {}
+
+        # 이 시각 이후의 새 메시지는 오늘 출석이므로 실시간 출석(attendance/live.py) 으로 알림
+        today = self.get_gardening_date()
+        live_cutoff = datetime.combine(today, time(hour=4))
+
+        for message in messages:
+            # ts_at 은 timezone 이 있는 시간, gardening_date 는 새벽 4시 기준 날짜 (sql/008_ts_at.sql)
+            ts_at = datetime.fromtimestamp(float(message["ts"]), self.kst)
+            ts_kst = ts_at.replace(tzinfo=None)
+            # ts_for_db 는 기존 데이터와 같이 KST+9시간. 서버 timezone 과 상관없이 같은 값이 되도록 ts_at 에서 만듦
+            ts_for_db = ts_kst + timedelta(hours=9)
+            attachments = compact_attachments(message.get("attachments"))
+            raw = None
+            if self.store_raw_payload:
+                raw = {key: value for (key, value) in message.items() if key not in RAW_EXCLUDED_FIELDS}
+
+            # 메시지 하나가 실패해도 트랜잭션 전체가 aborted 되지 않도록 메시지마다 savepoint
+            cursor.execute("SAVEPOINT insert_message")
+            message_profile_ids = {}
             try:
-                cursor.execute(insert_query, (
+                cursor.execute(upsert_query if "edited" in message else insert_query, (
                     message.get("ts"),
+                    ts_at,
+                    self.get_gardening_date(ts_kst),
                     ts_for_db,
-                    message.get("bot_id"),
-                    message.get("type"),
                     message.get("text"),
                     message.get("user"),
-                    message.get("team"),
-                    json.dumps(message.get("bot_profile")) if message.get("bot_profile") else None,
-                    json.dumps(message.get("attachments")) if message.get("attachments") else None
+                    self.intern_bot_profile(cursor, message, message_profile_ids),
+                    json.dumps(attachments) if attachments else None
                 ))
+                row = cursor.fetchone()
+                # 이미 있던 메시지(DO NOTHING)는 row 가 없음
+                if raw and row is not None:
+                    cursor.execute("""
+                        INSERT INTO slack_message_raw (ts, payload) VALUES (%s, %s)
+                        ON CONFLICT (ts) DO UPDATE SET payload = EXCLUDED.payload
+                    """, (message["ts"], json.dumps(raw)))
+                self.insert_commit_search(cursor, message, ts_for_db)
+                # 새로 들어온 메시지만 저장소별 집계에 반영 (중복/수정은 제외)
+                if row is not None and row[0]:
+                    self.update_repository_activity(cursor, message, ts_kst)
+                    if ts_kst >= live_cutoff:
+                        self.notify_live_attendance(cursor, ts_kst, attachments, today)
             except Exception as err:
                 print(f"Error inserting message: {err}")
+                cursor.execute("ROLLBACK TO SAVEPOINT insert_message")
                 continue
+            cursor.execute("RELEASE SAVEPOINT insert_message")
+            bot_profile_ids.update(message_profile_ids)
+
+        return bot_profile_ids
+
+    # 오늘 출석이 된 유저마다 알림. commit 될 때 전달됨
+    def notify_live_attendance(self, cursor, ts_kst, attachments, gardening_date):
+        authors = {attachment.get("author_name") for attachment in attachments or []}
+        for user in self.users:
+            if user in authors:
+                live.notify(cursor, self.pg_schema, user, ts_kst, gardening_date)
+
+    # bot_id, team, type, bot_profile 조합을 bot_profiles 에 한 번만 저장하고 id 를 돌려줌
+    # 새로 받은 id 는 new_ids 에 넣음. rollback 되면 없는 id 가 되므로 commit 된 뒤에 self.bot_profile_ids 에 옮김
+    def intern_bot_profile(self, cursor, message, new_ids):
+        (bot_id, team, type, bot_profile) = (message.get("bot_id"), message.get("team"), message.get("type"), message.get("bot_profile"))
+        key = json.dumps([bot_id, team, type, bot_profile], sort_keys=True)
+
+        if key in self.bot_profile_ids:
+            return self.bot_profile_ids[key]
+        if key not in new_ids:
+            profile = json.dumps(bot_profile) if bot_profile else None
+            # digest 는 sql/005_slim_storage.sql 과 같은 방식으로 계산
+            cursor.execute("""
+                INSERT INTO bot_profiles (digest, bot_id, team, type, profile)
+                VALUES (md5(jsonb_build_array(%s::varchar, %s::varchar, %s::varchar, %s::jsonb)::text), %s, %s, %s, %s)
+                ON CONFLICT (digest) DO UPDATE SET digest = EXCLUDED.digest
+                RETURNING id
+            """, (bot_id, team, type, profile, bot_id, team, type, profile))
+            new_ids[key] = cursor.fetchone()[0]
+        return new_ids[key]
+
+    # 검색용 커밋 테이블(commit_search) 갱신. attachment 하나가 커밋 메시지 하나
+    def insert_commit_search(self, cursor, message, ts_for_db):
+        for (idx, attachment) in enumerate(message.get("attachments") or []):
+            cursor.execute("""
+                INSERT INTO commit_search (ts, idx, github_username, repository, text, ts_for_db)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (ts, idx) DO UPDATE
+                SET github_username = EXCLUDED.github_username,
+                    repository = EXCLUDED.repository,
+                    text = EXCLUDED.text
+            """, (
+                message["ts"],
+                idx,
+                attachment.get("author_name"),
+                parse_repository(attachment.get("footer")),
+                attachment.get("text"),
+                ts_for_db
+            ))
+
+    # 저장소별, 유저-저장소별 커밋수/활동일수/마지막 활동 시간 누적
+    # github_username 이 '*' 인 row 는 저장소 전체 합계. activity_at 은 KST
+    def update_repository_activity(self, cursor, message, activity_at):
+        for attachment in message.get("attachments") or []:
+            repository = parse_repository(attachment.get("footer"))
+            if not repository:
+                continue
+
+            # "3 new commits pushed to ..." 형태면 커밋 수, 아니면 1
+            match = re.search(r'(\d+) new commits?', attachment.get("text") or "")
+            commit_count = int(match.group(1)) if match else 1
+
+            for github_username in [name for name in [attachment.get("author_name"), '*'] if name]:
+                cursor.execute("""
+                    WITH new_day AS (
+                        INSERT INTO repository_activity_days (repository, github_username, activity_date)
+                        VALUES (%s, %s, %s)
+                        ON CONFLICT DO NOTHING
+                        RETURNING 1
+                    )
+                    INSERT INTO repository_activity (repository, github_username, commit_count, active_days, last_activity_at)
+                    VALUES (%s, %s, %s, (SELECT COUNT(*) FROM new_day), %s)
+                    ON CONFLICT (repository, github_username) DO UPDATE
+                    SET commit_count = repository_activity.commit_count + EXCLUDED.commit_count,
+                        active_days = repository_activity.active_days + EXCLUDED.active_days,
+                        last_activity_at = GREATEST(repository_activity.last_activity_at, EXCLUDED.last_activity_at)
+                """, (
+                    repository, github_username, activity_at.date(),
+                    repository, github_username, commit_count, activity_at
+                ))
+
+    # 저장소 순위. user 가 있으면 그 유저의 저장소들
+    def get_repository_activity(self, user=None, limit=20):
+        conn = self.connect_postgres(readonly=True)
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+        cursor.execute("""
+            SELECT repository, commit_count, active_days, last_activity_at
+            FROM repository_activity
+            WHERE github_username = %s
+            ORDER BY commit_count DESC, last_activity_at DESC
+            LIMIT %s
+        """, (user or '*', limit))
+        rows = cursor.fetchall()
 
-        conn.commit()
         cursor.close()
         conn.close()
+        return rows
+
+    """
+    커밋 메시지 검색
+    검색어의 각 단어를 prefix 로 검색함 (한글 조사 대응). 결과는 관련도 순
+    start, end 는 date (KST, end 포함)
+    """
+    def search_commits(self, keyword, user=None, repository=None, start=None, end=None, limit=20, offset=0):
+        # tsquery 연산자로 쓰이는 문자는 제거
+        words = re.sub(r"[&|!:*()'\\<>]", " ", keyword).split()
+        if not words:
+            return []
+
+        tsquery = " & ".join(f"'{word}':*" for word in words)
+        query = """
+            SELECT ts, github_username, repository, text, ts_for_db,
+                   ts_rank_cd(document, query) AS rank
+            FROM commit_search, to_tsquery('simple', %s) AS query
+            WHERE document @@ query
+        """
+        params = [tsquery]
+
+        if user:
+            query += " AND github_username = %s"
+            params.append(user)
+        if repository:
+            query += " AND repository = %s"
+            params.append(repository)
+        # ts_for_db 는 KST+9시간 으로 저장되어 있음
+        if start:
+            query += " AND ts_for_db >= %s"
+            params.append(datetime.combine(start, datetime.min.time()) + timedelta(hours=9))
+        if end:
+            query += " AND ts_for_db < %s"
+            params.append(datetime.combine(end + timedelta(days=1), datetime.min.time()) + timedelta(hours=9))
+
+        query += " ORDER BY rank DESC, ts DESC LIMIT %s OFFSET %s"
+        params += [limit, offset]
+
+        conn = self.connect_postgres(readonly=True)
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        for row in rows:
+            row["datetime"] = row.pop("ts_for_db") - timedelta(hours=9)
+        return rows
 
     def remove_all_slack_messages(self):
         conn = self.connect_postgres()
         cursor = conn.cursor()
         
         cursor.execute("DELETE FROM slack_messages")
+        cursor.execute("DELETE FROM repository_activity")
+        cursor.execute("DELETE FROM repository_activity_days")
         conn.commit()
+        self.mark_written(cursor)
         
         cursor.close()
         conn.close()
 
+        self.attendance_cache.invalidate_all()
+        self.record_attendance_changes(self.users)
+
+    # 메시지들에 커밋이 있는 유저
+    def message_authors(self, messages):
+        authors = {
+            attachment.get("author_name")
+            for message in messages
+            for attachment in message.get("attachments") or []
+        }
+        return [user for user in self.users if user in authors]
+
+    """
+    유저들의 출석부를 변경 기록(attendance_changes) 의 마지막 상태와 비교해서 바뀐 칸만 쌓음
+    수집을 commit 하고 출석부 캐시를 무효화한 뒤에 호출. 기록이 비어 있으면 모든 유저를 기록함
+    """
+    def record_attendance_changes(self, users):
+        conn = self.connect_postgres()
+        cursor = conn.cursor()
+
+        # 동시에 기록하는 수집기는 여기서 기다림. version 순서와 commit 순서가 같아야
+        # since 로 읽는 쪽이 나중에 commit 된 더 작은 version 을 놓치지 않음
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(current_schema() || '.attendance_changes'))")
+        cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM attendance_changes)")
+        if cursor.fetchone()[0]:
+            users = self.users
+
+        for user in users:
+            cursor.execute("""
+                SELECT DISTINCT ON (gardening_date) gardening_date, first_ts
+                FROM attendance_changes
+                WHERE member = %s
+                ORDER BY gardening_date, version DESC
+            """, (user,))
+            recorded = {gardening_date: first_ts for (gardening_date, first_ts) in cursor.fetchall() if first_ts is not None}
+            current = {gardening_date: attends[0]["ts"] for (gardening_date, attends) in self.get_attendance_by_user(user).items()}
+
+            changes = [(user, gardening_date, first_ts) for (gardening_date, first_ts) in sorted(current.items())
+                       if recorded.get(gardening_date) != first_ts]
+            changes += [(user, gardening_date, None) for gardening_date in sorted(recorded) if gardening_date not in current]
+            if changes:
+                psycopg2.extras.execute_values(
+                    cursor,
+                    "INSERT INTO attendance_changes (member, gardening_date, first_ts) VALUES %s",
+                    changes
+                )
+
+        conn.commit()
+        self.mark_written(cursor)
+        cursor.close()
+        conn.close()
+
+    """
+    since(version) 이후에 바뀐 출석부 칸들. version 순서로 limit 개
+    @return (칸 리스트, 마지막 version). 바뀐 칸이 없으면 version 은 since 그대로
+    """
+    def get_attendance_changes(self, since=0, limit=1000):
+        conn = self.connect_postgres(readonly=True)
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+        cursor.execute("""
+            SELECT version, member AS user, gardening_date AS date, first_ts
+            FROM attendance_changes
+            WHERE version > %s
+            ORDER BY version
+            LIMIT %s
+        """, (since, limit))
+        changes = cursor.fetchall()
+
+        cursor.close()
+        conn.close()
+        return (changes, changes[-1]["version"] if changes else since)
+
     """
     특정일의 출석 데이터 불러오기
     @param selected_date
@@ -220,7 +818,7 @@ class Garden:
 
         # get all users attendance info
         for user in self.users:
-            attends = self.find_attendance_by_user(user)
+            attends = self.get_attendance_by_user(user)
             attend_dict[user] = attends
 
         result = {}
@@ -240,43 +838,19 @@ class Garden:
 
         return result_attendance
 
+    # 시즌 전체 출석부 csv. 첫 줄은 날짜, 이후 유저별 날짜별 첫 출석 시간
     def generate_attendance_csv(self):
-        attend_dict = {}
+        dates = [self.start_date + timedelta(days=days) for days in range(int(self.gardening_days))]
 
-        for user in self.users:
-            attends = self.find_attendance_by_user(user)
-            attend_dict[user] = attends
-
-        result = {}
-
-        selected_date = datetime(2019, 10, 24).date()
-        # selected_date = datetime.strptime("20191024", "%Y%m%d").date()
-        print("=======")
-        for days in range(10):
-            # print dates
-            print(selected_date, end=',')
-
-            # make users - dates - first_ts
-            for user in attend_dict:
-                if user not in result:
-                    result[user] = {}
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["user"] + [selected_date.strftime("%Y-%m-%d") for selected_date in dates])
 
-                result[user][selected_date] = ""
-
-                if selected_date in attend_dict[user]:
-                    result[user][selected_date] = attend_dict[user][selected_date][0]["ts"]
-
-            selected_date = selected_date + timedelta(days=1)
-
-        print("")
-        print("=======")
+        for user in self.users:
+            attends = self.get_attendance_by_user(user)
+            writer.writerow([user] + [attends[selected_date][0]["ts"] if selected_date in attends else "" for selected_date in dates])
 
-        # print result csv
-        for (user, dates) in result.items():
-            for (date, first_ts) in dates.items():
-                # print(date, first_ts)
-                print(first_ts, end=',')
-            print("")
+        return output.getvalue()
 
     def send_no_show_message(self):
         members = self.get_members()
@@ -300,5 +874,4 @@ class Garden:
         #     text='@junho85 test',
         #     link_names=1
         # )
-        response = self.slack_client.users_list()
-        print(response)
+        return self.slack_client.users_list()
@@ -0,0 +1,232 @@
+"""
+백그라운드 작업 큐 (sql/006_jobs.sql)
+
+수집(collect), csv 생성처럼 오래 걸리는 작업은 HTTP 요청 안에서 처리하지 않고 jobs 테이블에 넣는다.
+attendance/cli_worker.py 가 정해진 수(concurrency)의 thread 로 작업을 하나씩 가져가서 처리하고,
+진행 상황(progress)과 결과(result)를 같은 row 에 기록한다. 조회는 /attendance/api/jobs/<id>
+
+    enqueue(garden, "collect", {"oldest": ..., "latest": ...}) -> job id
+"""
+
+import json
+import math
+import os
+import socket
+import threading
+import time
+import traceback
+
+import psycopg2.extras
+
+from . import snapshot
+from .garden import Garden, garden_slugs
+
+# 처리 중인 작업의 heartbeat 가 이보다 오래되면 worker 가 죽은 것으로 보고 다시 대기열로 돌림
+STALE_SECONDS = 300
+HEARTBEAT_SECONDS = 30
+# 이만큼 시도해도 끝나지 않은 작업은 failed
+MAX_ATTEMPTS = 3
+# 수집 구간을 나누는 단위(초). 진행률을 보여주고 트랜잭션을 작게 유지함
+COLLECT_CHUNK_SECONDS = 60 * 60 * 24
+
+
+def enqueue(garden, kind, params=None):
+    """
+    작업을 대기열에 넣고 id 를 돌려줌. 같은 작업이 이미 대기/처리 중이면 그 작업의 id
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"unknown job kind: {kind}")
+    params = json.dumps(params or {}, sort_keys=True)
+
+    conn = garden.connect_postgres()
+    cursor = conn.cursor()
+    # 대기/처리 중인 같은 작업은 unique 인덱스(sql/006_jobs.sql 의 idx_jobs_active_unique) 로 하나만 들어감
+    # 넣지 못했으면 그 작업의 id 를 읽음. 그 사이에 끝나서 없으면 다시 넣음
+    row = None
+    while row is None:
+        cursor.execute("""
+            INSERT INTO jobs (kind, params) VALUES (%s, %s)
+            ON CONFLICT (kind, params) WHERE status IN ('queued', 'running') DO NOTHING
+            RETURNING id
+        """, (kind, params))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute("""
+                SELECT id FROM jobs
+                WHERE kind = %s AND params = %s::jsonb AND status IN ('queued', 'running')
+            """, (kind, params))
+            row = cursor.fetchone()
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return row[0]
+
+
+def get_job(garden, job_id):
+    conn = garden.connect_postgres()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cursor.execute("""
+        SELECT id, kind, params, status, progress, result, error, attempts,
+               created_at, started_at, finished_at
+        FROM jobs
+        WHERE id = %s
+    """, (job_id,))
+    job = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return job
+
+
+class Job:
+    def __init__(self, garden, job_id, kind, params):
+        self.garden = garden
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+
+    def execute(self, query, params):
+        conn = self.garden.connect_postgres()
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    # 진행 상황 기록. heartbeat 도 함께 갱신됨
+    def progress(self, **values):
+        self.execute(
+            "UPDATE jobs SET progress = %s, heartbeat_at = NOW() WHERE id = %s",
+            (json.dumps(values), self.id)
+        )
+
+    def heartbeat(self):
+        self.execute("UPDATE jobs SET heartbeat_at = NOW() WHERE id = %s", (self.id,))
+
+    def finish(self, result=None, error=None):
+        self.execute("""
+            UPDATE jobs
+            SET status = %s, result = %s, error = %s, finished_at = NOW(), heartbeat_at = NOW()
+            WHERE id = %s
+        """, ("failed" if error else "done", json.dumps(result, default=str) if result is not None else None, error, self.id))
+
+
+def claim(garden, worker):
+    """
+    대기 중인 작업 하나를 running 으로 바꾸고 Job 으로 돌려줌. 없으면 None
+    여러 worker 가 동시에 호출해도 FOR UPDATE SKIP LOCKED 로 서로 다른 작업을 가져감
+    """
+    conn = garden.connect_postgres()
+    cursor = conn.cursor()
+
+    # heartbeat 가 끊긴 작업(worker 종료 등)은 다시 대기열로. 여러 번 실패했으면 failed
+    cursor.execute("""
+        UPDATE jobs
+        SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'queued' END,
+            error = 'worker stopped responding',
+            finished_at = CASE WHEN attempts >= %s THEN NOW() END
+        WHERE status = 'running' AND heartbeat_at < NOW() - %s * INTERVAL '1 second'
+    """, (MAX_ATTEMPTS, MAX_ATTEMPTS, STALE_SECONDS))
+
+    cursor.execute("""
+        UPDATE jobs
+        SET status = 'running', attempts = attempts + 1, worker = %s,
+            started_at = NOW(), heartbeat_at = NOW(), progress = NULL, error = NULL
+        WHERE id = (
+            SELECT id FROM jobs
+            WHERE status = 'queued'
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id, kind, params
+    """, (worker,))
+    row = cursor.fetchone()
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    if row is None:
+        return None
+    return Job(garden, *row)
+
+
+# oldest ~ latest 를 하루씩 나눠서 수집
+def run_collect(garden, job):
+    oldest = float(job.params["oldest"])
+    latest = float(job.params["latest"])
+    total = max(math.ceil((latest - oldest) / COLLECT_CHUNK_SECONDS), 1)
+
+    messages = 0
+    for index in range(total):
+        start = oldest + index * COLLECT_CHUNK_SECONDS
+        end = min(start + COLLECT_CHUNK_SECONDS, latest)
+        # oldest 는 포함되지 않으므로 경계의 메시지가 빠지지 않게 이전 구간 끝에서 1us 당겨서 시작
+        messages += garden.collect_slack_messages(start - 0.000001 if index else start, end)
+        job.progress(done=index + 1, total=total, messages=messages)
+
+    if garden.snapshot_dir:
+        snapshot.publish(garden, garden.snapshot_dir)
+
+    return {"messages": messages, "slack": garden.slack_client.get_stats()}
+
+
+def run_csv(garden, job):
+    return {"csv": garden.generate_attendance_csv()}
+
+
+HANDLERS = {
+    "collect": run_collect,
+    "csv": run_csv,
+}
+
+
+def run(job):
+    # 처리 시간이 긴 단계에서도 heartbeat 가 끊기지 않도록 별도 thread 에서 갱신
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_SECONDS):
+            job.heartbeat()
+
+    threading.Thread(target=beat, daemon=True).start()
+    try:
+        result = HANDLERS[job.kind](job.garden, job)
+        job.finish(result=result)
+        print(f"job {job.id} ({job.kind}) done")
+    except Exception:
+        job.finish(error=traceback.format_exc())
+        print(f"job {job.id} ({job.kind}) failed")
+    finally:
+        stop.set()
+
+
+def work(name, poll_interval, once):
+    worker = f"{socket.gethostname()}:{os.getpid()}:{name}"
+    while True:
+        # 정원마다 스키마(jobs 테이블)가 따로 있으므로 차례로 확인
+        # Garden 은 설정/캐시 상태를 가지므로 작업마다 새로 만듦
+        job = None
+        for slug in garden_slugs():
+            job = claim(Garden(slug), worker)
+            if job is not None:
+                break
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        run(job)
+
+
+def run_workers(concurrency=2, poll_interval=2.0, once=False):
+    """
+    concurrency 개의 thread 로 작업을 처리한다. once 면 대기열이 빌 때까지만 처리하고 끝냄
+    """
+    threads = [
+        threading.Thread(target=work, args=(str(index), poll_interval, once), daemon=True)
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
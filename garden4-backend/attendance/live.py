@@ -0,0 +1,143 @@
+"""
+실시간 출석 알림 (index 페이지의 Server-Sent Events)
+
+수집이 오늘 출석이 되는 새 메시지를 저장하면 같은 트랜잭션에서 pg_notify 로 알리고 (commit 될 때 전달됨)
+웹 프로세스마다 thread 하나가 LISTEN 하다가 구독 중인 요청들의 queue 로 나눠준다.
+수집은 worker(attendance/cli_worker.py) 에서 하므로 프로세스 사이는 PostgreSQL 로 전달함
+
+replica 에서는 LISTEN 할 수 없으므로 primary(HOST) 에 연결한다.
+"""
+
+import json
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+# 모든 정원이 같은 채널을 쓰고 payload 의 schema 로 구분함
+CHANNEL = "garden4_live"
+
+# 이벤트가 없어도 이 간격(초)으로 주석을 보내서 연결을 유지함. nginx proxy_read_timeout(60s) 보다 짧게
+KEEPALIVE_SECONDS = 15
+# 요청 하나가 worker 를 잡고 있는 최대 시간(초). 끊기면 브라우저(EventSource)가 RETRY_MILLISECONDS 뒤에 다시 연결함
+STREAM_SECONDS = 30 * 60
+RETRY_MILLISECONDS = 3000
+# 느린 구독자는 이만큼 쌓이면 새 이벤트를 버림
+QUEUE_SIZE = 100
+# LISTEN 연결이 끊기면 이 시간(초) 뒤에 다시 연결
+RECONNECT_SECONDS = 5
+
+
+def notify(cursor, schema, user, ts, gardening_date):
+    """
+    insert 와 같은 트랜잭션에서 호출. rollback 되면 알림도 나가지 않음
+    ts 는 KST datetime, gardening_date 는 출석으로 치는 날짜
+    """
+    payload = json.dumps({
+        "schema": schema,
+        "user": user,
+        "ts": ts.isoformat(),
+        "date": gardening_date.strftime("%Y-%m-%d"),
+    })
+    cursor.execute("SELECT pg_notify(%s, %s)", (CHANNEL, payload))
+
+
+class Listener:
+    """
+    접속 정보별로 LISTEN 연결 하나. 첫 구독자가 생길 때 thread 를 띄움
+    구독자는 schema 별 queue 로 이벤트(dict)를 받는다.
+    """
+
+    def __init__(self, **params):
+        self.params = params
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self, schema):
+        events = queue.Queue(maxsize=QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.setdefault(schema, set()).add(events)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="garden4-live", daemon=True)
+                self.thread.start()
+        return events
+
+    def unsubscribe(self, schema, events):
+        with self.lock:
+            self.subscribers.get(schema, set()).discard(events)
+
+    def run(self):
+        while True:
+            try:
+                self.listen()
+            except psycopg2.Error as e:
+                print(f"live listener error: {e}".strip())
+            time.sleep(RECONNECT_SECONDS)
+
+    def listen(self):
+        conn = psycopg2.connect(**self.params)
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {CHANNEL}")
+            cursor.close()
+            while True:
+                # 알림이 오면 소켓이 읽기 가능해짐
+                if select.select([conn], [], [], KEEPALIVE_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self.dispatch(json.loads(conn.notifies.pop(0).payload))
+        finally:
+            conn.close()
+
+    def dispatch(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers.get(event.pop("schema"), ()))
+        for events in subscribers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                pass
+
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def subscribe(garden):
+    """
+    garden 의 실시간 출석 이벤트를 받을 queue 와 구독 해제 함수를 돌려줌
+    """
+    params = garden.pg_params()
+    key = tuple(sorted(params.items()))
+    with _listeners_lock:
+        listener = _listeners.get(key)
+        if listener is None:
+            listener = _listeners[key] = Listener(**params)
+    events = listener.subscribe(garden.pg_schema)
+    return (events, lambda: listener.unsubscribe(garden.pg_schema, events))
+
+
+def stream(garden):
+    """
+    text/event-stream 본문. attend 이벤트 data 는 {"user", "ts"(KST), "date"(출석 날짜)}
+    클라이언트가 끊으면 Django 가 generator 를 닫으므로 finally 에서 구독을 해제함
+    """
+    (events, unsubscribe) = subscribe(garden)
+    deadline = time.monotonic() + STREAM_SECONDS
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        while time.monotonic() < deadline:
+            try:
+                event = events.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: attend\ndata: {json.dumps(event)}\n\n"
+    finally:
+        unsubscribe()
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from attendance import scheduler
+
+
+class Command(BaseCommand):
+    help = "수집, 미출석자 알림, snapshot 갱신을 계속 실행하는 scheduler (attendance/scheduler.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help="정원 slug. 없으면 설정된 모든 정원")
+        parser.add_argument('--interval', type=int, help="수집 간격(초). 기본은 SCHEDULER_INTERVAL")
+        parser.add_argument('--bind', help="상태 확인(/health) 주소 host:port. 기본은 SCHEDULER_BIND")
+        parser.add_argument('--once', action='store_true', help="한 번만 실행하고 종료 (cron 용)")
+
+    def handle(self, *args, **options):
+        runner = scheduler.create(options['slugs'], options['interval'])
+        garden = runner.gardens[0]
+
+        lock = scheduler.acquire_lock(garden)
+        if lock is None:
+            sys.exit("another garden_scheduler is already running")
+
+        if not options['once']:
+            bind = options['bind'] or garden.scheduler_bind
+            runner.serve_health(bind)
+            print(f"garden_scheduler started (interval={runner.interval}s, health=http://{bind}/health, "
+                  f"gardens={', '.join(garden.slug for garden in runner.gardens)})")
+
+        try:
+            runner.run(once=options['once'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            lock.close()
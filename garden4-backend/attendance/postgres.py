@@ -0,0 +1,143 @@
+"""
+PostgreSQL connection pool
+
+한 프로세스의 모든 정원(Garden)이 접속 정보별로 pool 하나를 같이 쓴다.
+정원별 데이터는 스키마로 나뉘어 있으므로 connection 을 빌려줄 때마다 search_path 를 그 정원의 스키마로 바꾼다.
+빌려간 쪽에서 conn.close() 를 부르면 연결을 끊지 않고 pool 로 돌려줌 (진행 중인 트랜잭션은 rollback)
+
+읽기 전용 replica 도 host 별로 pool 을 두고 connect_replica() 로 빌려준다.
+연결이 안 되는 replica 는 잠시 빼고, 마지막 쓰기(LSN)가 아직 반영되지 않은 replica 도 건너뜀
+"""
+
+import random
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    pool = None
+
+    def close(self):
+        pool = self.pool
+        if pool is None:
+            return super().close()
+        self.pool = None
+        pool.release(self)
+
+
+class ConnectionPool:
+    """
+    size 개까지는 쉬는 연결을 남겨두고, 동시에 max_size 개까지 빌려줌
+    모두 빌려간 상태면 돌아올 때까지 기다린다 (psycopg2 pool 은 바로 예외를 냄)
+    """
+
+    def __init__(self, size, max_size, **params):
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
+            size, max_size, connection_factory=PooledConnection, **params
+        )
+        self.slots = threading.BoundedSemaphore(max_size)
+
+    def acquire(self, schema):
+        self.slots.acquire()
+        try:
+            conn = self.checkout(schema)
+        except Exception:
+            self.slots.release()
+            raise
+        conn.pool = self
+        return conn
+
+    def checkout(self, schema):
+        conn = self.pool.getconn()
+        try:
+            set_search_path(conn, schema)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # 쉬는 동안 서버(또는 pgbouncer)가 끊은 연결. 버리고 새로 연결함
+            self.pool.putconn(conn, close=True)
+            conn = self.pool.getconn()
+            set_search_path(conn, schema)
+        return conn
+
+    def release(self, conn):
+        try:
+            self.pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self.slots.release()
+
+
+def set_search_path(conn, schema):
+    cursor = conn.cursor()
+    cursor.execute(f"SET search_path TO {schema}")
+    cursor.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def connect(schema, size, max_size, **params):
+    """
+    접속 정보(params)가 같은 pool 에서 connection 을 빌려줌. search_path 는 schema
+    """
+    key = tuple(sorted(params.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(size, max_size, **params)
+    return pool.acquire(schema)
+
+
+# 연결에 실패한 replica 는 이 시간(초) 동안 쓰지 않음
+REPLICA_RETRY_SECONDS = 30
+
+# (host, port) -> 다시 시도할 시각
+_replica_down_until = {}
+# (host, port) -> 마지막으로 확인한 replay 위치. 이보다 앞선 LSN 은 다시 묻지 않음
+_replica_replayed = {}
+
+
+# '16/B374D848' -> 정수. pg_lsn 은 문자열로는 크기를 비교할 수 없음
+def lsn_value(lsn):
+    (high, low) = lsn.split('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def caught_up(conn, replica, min_lsn):
+    if _replica_replayed.get(replica, 0) >= min_lsn:
+        return True
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_last_wal_replay_lsn()")
+    replayed = cursor.fetchone()[0]
+    cursor.close()
+    # recovery 중이 아니면(승격된 서버 등) 바로 읽어도 됨
+    if replayed is None:
+        return True
+    _replica_replayed[replica] = lsn_value(replayed)
+    return _replica_replayed[replica] >= min_lsn
+
+
+def connect_replica(replicas, schema, size, max_size, min_lsn=None, **params):
+    """
+    replicas [(host, port), ...] 중 하나에서 connection 을 빌려줌. 부하를 나누도록 시작 위치는 무작위
+    min_lsn(primary 에 마지막으로 쓴 위치) 까지 반영된 replica 가 없거나 모두 연결할 수 없으면 None
+    """
+    start = random.randrange(len(replicas))
+    for replica in replicas[start:] + replicas[:start]:
+        if _replica_down_until.get(replica, 0) > time.monotonic():
+            continue
+        (host, port) = replica
+        try:
+            conn = connect(schema, size, max_size, **dict(params, host=host, port=port))
+        except psycopg2.OperationalError as e:
+            print(f"replica {host}:{port} unavailable: {e}".strip())
+            _replica_down_until[replica] = time.monotonic() + REPLICA_RETRY_SECONDS
+            continue
+        if min_lsn is not None and not caught_up(conn, replica, min_lsn):
+            conn.close()
+            continue
+        return conn
+    return None
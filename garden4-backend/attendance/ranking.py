@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+
+class MemberStats:
+    """
+    유저 한명의 시즌 통계
+    count, rate, missed 는 판정이 끝난 날(어제까지) 기준이고
+    current_streak 은 오늘 출석했으면 오늘까지 이어서 센다.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.count = 0
+        self.rate = 0.0
+        self.rank = None
+        self.run = 0  # 어제까지 이어진 연속 출석일
+        self.current_streak = 0
+        self.longest_streak = 0
+        self.missed = []
+        self.attended_today = False
+
+    def as_dict(self):
+        return {
+            "user": self.user,
+            "count": self.count,
+            "rate": self.rate,
+            "rank": self.rank,
+            "current_streak": self.current_streak,
+            "longest_streak": self.longest_streak,
+            "attended_today": self.attended_today,
+            "missed": [date.strftime("%Y-%m-%d") for date in self.missed],
+        }
+
+
+def season_dates(start_date, gardening_days, end_date):
+    """
+    시작일부터 end_date 전날까지. 단 시즌 마지막 날까지만
+    """
+    days = min(int(gardening_days), (end_date - start_date).days)
+    return [start_date + timedelta(n) for n in range(max(days, 0))]
+
+
+def compute_stats(attendance_by_user, dates):
+    """
+    판정이 끝난 날짜들(dates) 에 대해 유저별 통계를 한번에 계산함. O(유저 수 x 날짜 수)
+    attendance_by_user: {user: {date: ...}}
+    """
+    stats = {}
+    for (user, attendance) in attendance_by_user.items():
+        member = MemberStats(user)
+        for date in dates:
+            if date in attendance:
+                member.count += 1
+                member.run += 1
+                member.longest_streak = max(member.longest_streak, member.run)
+            else:
+                member.run = 0
+                member.missed.append(date)
+
+        member.rate = (member.count / len(dates) * 100) if dates else 0.0
+        member.current_streak = member.run
+        stats[user] = member
+
+    assign_rank(stats.values())
+    return stats
+
+
+def apply_today(member, attended_today):
+    """
+    어제까지 계산된 통계에 오늘 출석 여부만 반영. 오늘 출석이 새로 들어와도 전체를 다시 계산하지 않는다
+    """
+    member.attended_today = attended_today
+    member.current_streak = member.run + 1 if attended_today else member.run
+    member.longest_streak = max(member.longest_streak, member.current_streak)
+    return member
+
+
+def assign_rank(members):
+    """
+    출석일수 기준 dense rank. 같은 출석일수는 같은 순위
+    """
+    counts = sorted({member.count for member in members}, reverse=True)
+    rank_by_count = {count: rank for (rank, count) in enumerate(counts, 1)}
+    for member in members:
+        member.rank = rank_by_count[member.count]
@@ -0,0 +1,168 @@
+"""
+수집/미출석자 알림 scheduler (python manage.py garden_scheduler)
+
+cron 으로 cli_collect.py, cli_noti_no_show.py 를 매번 새로 띄우는 대신 한 프로세스가 계속 돌면서
+정원(Garden)별 Slack client 와 connection pool 을 재사용한다. 설정을 바꾸면 다시 띄워야 함
+
+- SCHEDULER_INTERVAL 초마다 모든 정원을 차례로 수집. 새 메시지가 있으면 출석부 캐시를 다시 채우고 snapshot 갱신
+- 정원의 NO_SHOW_TIME(KST HH:MM) 이 지나면 하루 한 번 미출석자 알림
+- 작업은 한 thread 에서 차례로 하고, DB 하나에 scheduler 는 하나만 돈다 (PostgreSQL advisory lock)
+- http://<SCHEDULER_BIND>/health 에서 정원별 마지막 실행 결과(JSON). 마지막 수집이 오래되면 503
+"""
+
+import json
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psycopg2
+from django.conf import settings
+from django.core.cache import cache
+
+from . import snapshot
+from .garden import Garden, garden_slugs
+
+# 알림 시각부터 이 시간 안에만 보냄. 그 뒤에 scheduler 가 뜨면 그날은 건너뜀
+NO_SHOW_WINDOW = timedelta(hours=1)
+# 마지막 수집이 interval 의 이 배수보다 오래되면 unhealthy
+HEALTH_INTERVALS = 3
+
+
+def collect(garden):
+    """
+    마지막으로 저장한 메시지 이후만 수집하고, 새 메시지가 있거나 출석일이 바뀌었으면 정적 snapshot 갱신
+    새 메시지가 있으면 출석부 캐시를 미리 채워서 수집 직후 첫 요청이 전체 출석부를 다시 계산하지 않게 함
+    (웹 프로세스와 같은 캐시(REDIS_URL) 를 쓸 때만. 프로세스 로컬 메모리면 채워도 웹에서는 안 보임)
+    @return {"messages": 수집한 메시지 수, "snapshot": 새 snapshot version 또는 None}
+    """
+    count = garden.collect_new_slack_messages()
+    if count and 'locmem' not in settings.CACHES['default']['BACKEND']:
+        garden.get_stats()
+
+    version = None
+    if garden.snapshot_dir and (count or snapshot.is_stale(garden, garden.snapshot_dir)):
+        version = snapshot.publish(garden, garden.snapshot_dir)
+    return {"messages": count, "snapshot": version}
+
+
+def no_show_due(garden, now):
+    if garden.no_show_time is None:
+        return False
+    at = datetime.combine(now.date(), garden.no_show_time)
+    if not at <= now < at + NO_SHOW_WINDOW:
+        return False
+    # 하루 한 번. REDIS_URL 을 쓰면 scheduler 를 다시 띄워도 같은 날 두 번 보내지 않음
+    return cache.add(f"garden4:scheduler:{garden.slug}:no_show:{now.date()}", True, timeout=60 * 60 * 48)
+
+
+class Scheduler:
+    """
+    gardens 를 interval 초마다 수집하고 알림 시각이 되면 미출석자 알림을 보냄
+    status 에 정원별, 작업별 마지막 실행 결과를 남김
+    """
+
+    def __init__(self, gardens, interval):
+        self.gardens = gardens
+        self.interval = interval
+        self.status = {
+            "started_at": self.now(),
+            "interval": interval,
+            "last_cycle_at": None,
+            "gardens": {garden.slug: {} for garden in gardens},
+        }
+        self.lock = threading.Lock()
+
+    # KST
+    def now(self):
+        return datetime.now(self.gardens[0].kst).replace(tzinfo=None)
+
+    def run_task(self, garden, name, task):
+        started_at = self.now()
+        try:
+            result = task(garden)
+            last_run = {"ok": True, "result": result}
+            print(f"[{garden.slug}] {name}: {result}")
+        except Exception as e:
+            traceback.print_exc()
+            last_run = {"ok": False, "error": str(e)}
+        last_run.update(started_at=started_at, seconds=round((self.now() - started_at).total_seconds(), 3))
+        with self.lock:
+            self.status["gardens"][garden.slug][name] = last_run
+
+    def run_once(self):
+        for garden in self.gardens:
+            self.run_task(garden, "collect", collect)
+
+        for garden in self.gardens:
+            if no_show_due(garden, self.now()):
+                self.run_task(garden, "no_show", Garden.send_no_show_message)
+
+        with self.lock:
+            self.status["last_cycle_at"] = self.now()
+
+    def run(self, once=False):
+        while True:
+            started = time.monotonic()
+            self.run_once()
+            if once:
+                return
+            time.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+    def health(self):
+        with self.lock:
+            status = json.loads(json.dumps(self.status, default=str))
+            last_cycle_at = self.status["last_cycle_at"] or self.status["started_at"]
+        healthy = self.now() - last_cycle_at < timedelta(seconds=self.interval * HEALTH_INTERVALS)
+        status["healthy"] = healthy
+        return (200 if healthy else 503, status)
+
+    def serve_health(self, bind):
+        (host, _, port) = bind.rpartition(':')
+        scheduler = self
+
+        class HealthHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/health':
+                    self.send_error(404)
+                    return
+                (code, status) = scheduler.health()
+                body = json.dumps(status, ensure_ascii=False).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host or '0.0.0.0', int(port)), HealthHandler)
+        threading.Thread(target=server.serve_forever, name="garden4-scheduler-health", daemon=True).start()
+        return server
+
+
+def acquire_lock(garden):
+    """
+    DB 하나에 scheduler 하나만 돌도록 session advisory lock 을 잡은 연결을 돌려줌. 이미 잡혀 있으면 None
+    연결이 끊기면 lock 도 풀리므로 scheduler 가 끝날 때까지 닫지 않음 (pool 을 쓰지 않음)
+    """
+    conn = psycopg2.connect(**garden.pg_params())
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_lock(hashtext('garden4.scheduler'))")
+    locked = cursor.fetchone()[0]
+    cursor.close()
+    if not locked:
+        conn.close()
+        return None
+    return conn
+
+
+def create(slugs=None, interval=None):
+    """
+    설정된 정원(또는 slugs) 의 Garden 을 한 번만 만들어서 계속 씀
+    """
+    gardens = [Garden(slug) for slug in (slugs or garden_slugs())]
+    return Scheduler(gardens, interval or gardens[0].scheduler_interval)
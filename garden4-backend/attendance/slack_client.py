@@ -0,0 +1,232 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+# Slack Web API rate limit tier 별 분당 호출 허용량
+# https://api.slack.com/docs/rate-limits
+TIER_RATES = {
+    1: 1,
+    2: 20,
+    3: 50,
+    4: 100,
+}
+
+# 메소드별 tier. 목록에 없는 메소드는 DEFAULT_TIER 로 취급
+METHOD_TIERS = {
+    'conversations.history': 3,
+    'users.list': 2,
+    'chat.postMessage': 4,  # 실제로는 채널당 초당 1회 수준의 special tier
+}
+DEFAULT_TIER = 3
+
+
+class TokenBucket:
+    """
+    분당 rate 만큼 토큰이 채워지는 token bucket.
+    acquire() 는 토큰이 생길 때까지 기다리고 기다린 시간(초)을 돌려준다.
+    """
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1, rate_per_minute // 10)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def drain(self, seconds):
+        # seconds 동안은 토큰을 내주지 않도록 비워둔다
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 1) - seconds * self.rate
+
+
+class SlackStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.coalesced = 0
+        self.throttled_seconds = 0.0
+
+    def add(self, **kwargs):
+        with self.lock:
+            for (name, value) in kwargs.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "coalesced": self.coalesced,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+            }
+
+
+class _SharedState:
+    """
+    같은 토큰을 쓰는 client 들이 프로세스 안에서 공유하는 상태.
+    view 마다 Garden() 을 새로 만들기 때문에 bucket, 진행중 요청, 카운터는 client 가 아니라 토큰 단위로 둔다.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.in_flight = {}
+        self.stats = SlackStats()
+
+    def bucket(self, tier):
+        with self.lock:
+            if tier not in self.buckets:
+                self.buckets[tier] = TokenBucket(TIER_RATES[tier])
+            return self.buckets[tier]
+
+
+_shared_states = {}
+_shared_states_lock = threading.Lock()
+
+
+def _shared_state(token):
+    with _shared_states_lock:
+        if token not in _shared_states:
+            _shared_states[token] = _SharedState()
+        return _shared_states[token]
+
+
+def _retry_after(headers):
+    for (name, value) in (headers or {}).items():
+        if name.lower() == 'retry-after':
+            if isinstance(value, list):
+                value = value[0]
+            return int(value)
+    return 1
+
+
+class GardenSlackClient:
+    """
+    WebClient 래퍼.
+    - tier 별 token bucket 으로 호출 간격 조절
+    - 429 응답은 Retry-After 만큼 쉬고 재시도, 네트워크 오류는 지수 backoff 로 재시도
+    - 같은 인자의 요청이 진행중이면 새로 호출하지 않고 그 결과를 같이 받음 (single-flight)
+      프로세스 안에서만 합쳐짐. 프로세스 사이(scheduler, worker)는 따로 받고, 저장만 Garden.lock_collection 으로 하나씩 함
+    """
+
+    def __init__(self, token, max_retries=5, backoff_base=1.0, backoff_max=30.0, **client_kwargs):
+        self.web_client = WebClient(token=token, **client_kwargs)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.shared = _shared_state(token)
+
+    @property
+    def stats(self):
+        return self.shared.stats
+
+    def get_stats(self):
+        return self.stats.as_dict()
+
+    def api_call(self, method, **kwargs):
+        tier = METHOD_TIERS.get(method, DEFAULT_TIER)
+        bucket = self.shared.bucket(tier)
+        attempt = 0
+
+        while True:
+            waited = bucket.acquire()
+            self.stats.add(calls=1, throttled_seconds=waited)
+            try:
+                return getattr(self.web_client, method.replace('.', '_'))(**kwargs)
+            except SlackApiError as err:
+                if err.response.status_code != 429 or attempt >= self.max_retries:
+                    raise
+                # Retry-After 만큼 bucket 을 비워두면 다음 acquire() 에서 그만큼 기다리게 된다
+                bucket.drain(_retry_after(err.response.headers))
+                self.stats.add(rate_limited=1, retries=1)
+            except OSError:
+                # urllib 의 연결 오류 (URLError, TimeoutError 포함)
+                if attempt >= self.max_retries:
+                    raise
+                backoff = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                self.stats.add(retries=1, throttled_seconds=backoff)
+                time.sleep(backoff)
+
+            attempt += 1
+
+    def _single_flight(self, key, func):
+        shared = self.shared
+        with shared.lock:
+            future = shared.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                shared.in_flight[key] = future
+
+        if not leader:
+            self.stats.add(coalesced=1)
+            return future.result()
+
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        finally:
+            with shared.lock:
+                del shared.in_flight[key]
+
+    def conversations_history_all(self, channel, oldest, latest, limit=200):
+        """
+        oldest ~ latest 사이의 메시지를 cursor 를 따라가며 모두 가져온다.
+        같은 채널, 같은 구간의 수집이 이미 진행중이면 그 결과를 공유한다.
+        """
+        key = ('conversations.history', channel, str(oldest), str(latest))
+
+        def fetch():
+            messages = []
+            cursor = None
+            while True:
+                params = {"channel": channel, "limit": limit}
+                # latest 가 없으면 현재까지
+                if oldest is not None:
+                    params["oldest"] = str(oldest)
+                if latest is not None:
+                    params["latest"] = str(latest)
+                if cursor:
+                    params["cursor"] = cursor
+                response = self.api_call('conversations.history', **params)
+                messages.extend(response["messages"])
+
+                cursor = (response.get("response_metadata") or {}).get("next_cursor")
+                if not response.get("has_more") or not cursor:
+                    return messages
+
+        return self._single_flight(key, fetch)
+
+    def chat_postMessage(self, **kwargs):
+        return self.api_call('chat.postMessage', **kwargs)
+
+    def users_list(self, **kwargs):
+        return self.api_call('users.list', **kwargs)
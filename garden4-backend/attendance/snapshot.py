@@ -0,0 +1,150 @@
+"""
+출석부 정적 snapshot
+
+공개 페이지와 API 응답을 파일로 만들어서 nginx 가 Django 를 거치지 않고 바로 내려주게 한다. (docs/nginx-server.conf)
+
+    <SNAPSHOT_DIR>/releases/<version>/attendance/gets.json (+ .gz)
+    <SNAPSHOT_DIR>/current -> releases/<version>
+    <SNAPSHOT_DIR>/<slug>/current -> releases/<version>   (기본 정원이 아닌 정원)
+
+새 snapshot 은 releases 아래 임시 디렉토리에 전부 쓴 뒤 current 심볼릭 링크를 rename 으로 한 번에 바꾼다.
+읽는 쪽은 항상 완성된 snapshot 만 보게 됨
+"""
+
+import gzip
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+from django.contrib.staticfiles import finders
+from django.test import RequestFactory
+from django.urls import resolve
+
+from . import views
+
+# 남겨둘 이전 snapshot 수. 배포 중이던 요청이 이전 파일을 읽고 있을 수 있으므로 바로 지우지 않음
+KEEP_RELEASES = 5
+# 이보다 작은 파일은 압축하지 않음 (nginx gzip_static 은 .gz 가 없으면 원본을 내려줌)
+GZIP_MIN_SIZE = 256
+
+
+def snapshot_paths(garden, gardening_date):
+    # 기본 정원은 /attendance/, 다른 정원은 /<slug>/attendance/
+    base = views.base_path(garden)
+    paths = [
+        base,
+        f"{base}users/",
+        f"{base}gets",
+        f"{base}api/stats",
+        f"{base}api/repositories",
+    ]
+    for user in garden.get_member():
+        paths += [
+            f"{base}users/{user}/",
+            f"{base}api/users/{user}/",
+            f"{base}api/users/{user}/calendar",
+            f"{base}api/users/{user}/commits",
+        ]
+
+    # 날짜별 출석부는 시즌 시작일부터 오늘까지. 이후 날짜는 Django 가 응답
+    end_date = min(garden.start_date + timedelta(days=int(garden.get_gardening_days())), gardening_date + timedelta(days=1))
+    date = garden.start_date
+    while date < end_date:
+        paths.append(f"{base}get/{date.strftime('%Y%m%d')}")
+        date += timedelta(days=1)
+    return paths
+
+
+# /attendance/gets -> attendance/gets.json, /garden3/attendance/ -> garden3/attendance/index.html
+def file_name(path, content_type):
+    extension = "html" if content_type.startswith("text/html") else "json"
+    if path.endswith("/"):
+        return path.lstrip("/") + "index." + extension
+    return path.lstrip("/") + "." + extension
+
+
+def render(path):
+    request = RequestFactory().get(path)
+    match = resolve(path)
+    response = match.func(request, *match.args, **match.kwargs)
+    if response.status_code != 200:
+        raise RuntimeError(f"{path}: {response.status_code}")
+    return response.content, response["Content-Type"]
+
+
+def write_file(release_dir, name, content):
+    path = os.path.join(release_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(content)
+    if len(content) >= GZIP_MIN_SIZE:
+        # mtime=0 으로 같은 내용이면 같은 .gz 가 되게 함
+        with open(path + ".gz", "wb") as file:
+            file.write(gzip.compress(content, compresslevel=9, mtime=0))
+
+
+def copy_static_files(release_dir):
+    # /static/ 도 nginx 가 snapshot 에서 바로 내려주도록 함께 복사. 공개 페이지에서 쓰지 않는 admin 은 제외
+    for finder in finders.get_finders():
+        for (path, storage) in finder.list(["admin/*"]):
+            with storage.open(path) as file:
+                write_file(release_dir, os.path.join("static", path), file.read())
+
+
+def read_manifest(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, "current", "manifest.json")) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+# 새로 publish 해야 하는지. snapshot 이 없거나 마지막 publish 이후 출석일(새벽 4시 기준)이 바뀌었으면 True
+def is_stale(garden, snapshot_dir):
+    manifest = read_manifest(snapshot_dir)
+    return manifest is None or manifest.get("gardening_date") != str(garden.get_gardening_date())
+
+
+def prune_releases(releases_dir, current_version):
+    versions = sorted(name for name in os.listdir(releases_dir) if not name.startswith("."))
+    for version in versions[:-KEEP_RELEASES]:
+        if version != current_version:
+            shutil.rmtree(os.path.join(releases_dir, version), ignore_errors=True)
+
+
+def publish(garden, snapshot_dir, now=None):
+    """
+    snapshot 을 새로 만들고 current 를 교체한다. 만든 version 을 돌려줌
+    중간에 실패하면 current 는 그대로 두고 예외를 올림
+    """
+    now = now or datetime.now(garden.kst).replace(tzinfo=None)
+    gardening_date = garden.get_gardening_date()
+    version = now.strftime("%Y%m%d%H%M%S") + f"-{os.getpid()}"
+    releases_dir = os.path.join(snapshot_dir, "releases")
+    build_dir = os.path.join(releases_dir, f".{version}.tmp")
+    os.makedirs(build_dir)
+
+    try:
+        paths = snapshot_paths(garden, gardening_date)
+        for path in paths:
+            (content, content_type) = render(path)
+            write_file(build_dir, file_name(path, content_type), content)
+        # /static/ 은 기본 정원의 snapshot 에서만 내려줌
+        if garden.is_default:
+            copy_static_files(build_dir)
+
+        manifest = {"version": version, "generated_at": now.isoformat(), "gardening_date": str(gardening_date), "paths": len(paths)}
+        write_file(build_dir, "manifest.json", json.dumps(manifest).encode())
+        os.rename(build_dir, os.path.join(releases_dir, version))
+    except Exception:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    # 심볼릭 링크를 새로 만들고 rename 으로 덮어쓰면 current 가 없는 순간이 생기지 않음
+    link = os.path.join(snapshot_dir, f".current.{os.getpid()}")
+    os.symlink(os.path.join("releases", version), link)
+    os.replace(link, os.path.join(snapshot_dir, "current"))
+
+    prune_releases(releases_dir, version)
+    return version
@@ -1,5 +1,4 @@
-
-
-function getAvatarImgUrl(user) {
-    return `https://avatars.githubusercontent.com/${user}`;
+// 아바타는 출석부 서버가 크기별로 줄여서 캐시한 것을 씀 (attendance/avatars.py). size: 60, 80, 200
+function getAvatarImgUrl(user, size) {
+    return `${AVATAR_BASE_PATH}${user}/${size}`;
 }
\ No newline at end of file
@@ -7,8 +7,19 @@ urlpatterns = [
     path('users/', views.users, name='users'),
     path('users/<user>/', views.user, name='user'),
     path('api/users/<user>/', views.user_api, name='user'),
-    path('collect/', views.collect, name='collect'), # slack_messages 수집
-    path('csv/', views.csv, name='csv'),
+    path('api/users/<user>/calendar', views.user_calendar_api, name='user_calendar'), # 출석 달력 (날짜, 첫 출석, 커밋 수)
+    path('api/users/<user>/commits', views.user_commits_api, name='user_commits'), # 커밋 내역. ?before=<ts>&limit=50
+    path('collect/', views.collect, name='collect'), # slack_messages 수집 (백그라운드 작업)
+    path('csv/', views.csv, name='csv'), # 출석부 csv 생성
+    path('api/jobs/<int:job_id>', views.job_api, name='job'), # collect, csv 작업 상태/결과
     path('get/<date>', views.get, name='get'), # 특정일의 출석부 조회. 날짜기준
     path('gets', views.gets, name='get'), # 전체 출석부 조회. 리스트. 유저별.
+    path('api/stats', views.stats_api, name='stats'), # 유저별 출석률, 순위, 연속 출석일
+    path('api/search', views.search_api, name='search'), # 커밋 메시지 검색
+    path('api/repositories', views.repositories_api, name='repositories'), # 저장소별 커밋수, 활동일수
+    path('api/live', views.live_api, name='live'), # 실시간 출석 (text/event-stream)
+    path('api/changes', views.changes_api, name='changes'), # 출석부 변경분. ?since=<version>
+    path('api/admission', views.admission_api, name='admission'), # 무거운 요청 동시 실행 제한 통계
+    path('avatars/<user>/<int:size>', views.avatar, name='avatar'), # 정원사 아바타 (60, 80, 200px)
+    path('avatars/<user>/<digest>/<int:size>.<ext>', views.avatar_file, name='avatar_file'), # 캐시된 아바타 파일
 ]
@@ -1,7 +1,9 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from datetime import datetime, timedelta
-from .garden import Garden
+from .garden import Garden, GardenNotFound
+from . import admission, archive, avatars, jobs, live
 import pprint
 import markdown
 import re
@@ -23,17 +25,64 @@ def process_slack_links(text):
     return re.sub(pattern, replace_link, text)
 
 
-def index(request):
-    garden = Garden()
+# /<slug>/attendance/ 로 들어오면 그 정원, /attendance/ 는 기본 정원
+def get_garden(slug=None):
+    try:
+        return Garden(slug)
+    except GardenNotFound:
+        raise Http404(f"garden not found: {slug}")
+
+
+# 잘못된 query parameter. view 에서 잡아서 400 으로 응답함
+class InvalidParameter(ValueError):
+    pass
+
+
+def bad_request(err):
+    return JsonResponse({"error": str(err)}, status=400)
+
+
+# 정수 parameter. 없거나 비어 있으면 default, low ~ high 로 맞춤
+def int_param(request, name, default, low, high=None):
+    value = request.GET.get(name) or default
+    try:
+        value = int(value)
+    except ValueError:
+        raise InvalidParameter(f"{name} must be an integer")
+    value = max(value, low)
+    return min(value, high) if high is not None else value
+
+
+# YYYY-MM-DD 날짜 parameter. 없으면 None
+def date_param(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise InvalidParameter(f"{name} must be a date (YYYY-MM-DD)")
+
+
+# 정원의 출석부 주소. 기본 정원은 /attendance/, 다른 정원은 /<slug>/attendance/
+def base_path(garden):
+    if garden.is_default:
+        return reverse('attendance:index')
+    return reverse('garden:index', kwargs={'slug': garden.slug})
+
+
+def index(request, slug=None):
+    garden = get_garden(slug)
     context = {
-        "gardening_days": garden.get_gardening_days()
+        "gardening_days": garden.get_gardening_days(),
+        "base_path": base_path(garden),
     }
     return render(request, 'attendance/index.html', context)
 
 
 # 정원사들 리스트
-def users(request):
-    garden = Garden()
+def users(request, slug=None):
+    garden = get_garden(slug)
     users = garden.get_member()
     return JsonResponse(users, safe=False)
 
@@ -44,20 +93,21 @@ def daterange(start_date, end_date):
 
 
 # 유저별 출석부
-def user(request, user):
-    garden = Garden()
+def user(request, user, slug=None):
+    garden = get_garden(slug)
     context = {
         "user": user,
-        "gardening_days": garden.get_gardening_days()
+        "gardening_days": garden.get_gardening_days(),
+        "base_path": base_path(garden),
     }
 
     return render(request, 'attendance/users.html', context)
 
 
 # 유저의 출석데이터
-def user_api(request, user):
-    garden = Garden()
-    result = garden.find_attendance_by_user(user)
+def user_api(request, user, slug=None):
+    garden = get_garden(slug)
+    result = garden.get_attendance_by_user(user)
 
     output = []
     for (date, commits) in result.items():
@@ -71,27 +121,189 @@ def user_api(request, user):
     return JsonResponse(output, safe=False)
 
 
-# slack_messages 수집
-def collect(request):
+# 유저의 출석 달력. 날짜별 첫 출석 시간과 커밋 수만 내려줌
+def user_calendar_api(request, user, slug=None):
+    garden = get_garden(slug)
+    result = garden.get_attendance_by_user(user)
+
+    output = []
+    for (date, commits) in sorted(result.items()):
+        output.append({"date": date, "first_ts": commits[0]["ts"], "commit_count": len(commits)})
+
+    return JsonResponse(output, safe=False)
+
+
+# 유저의 커밋 내역. ?before=<ts>&limit=50
+def user_commits_api(request, user, slug=None):
+    before = request.GET.get('before')
+    try:
+        limit = int_param(request, 'limit', 50, 1, 200)
+    except InvalidParameter as err:
+        return bad_request(err)
+
+    garden = get_garden(slug)
+    commits = garden.find_commits_by_user(user, before=before, limit=limit)
+
+    for commit in commits:
+        # 커밋이 어느 출석일에 해당하는지 (새벽 4시 이전은 전날)
+        commit["date"] = garden.get_gardening_date(commit["datetime"])
+        commit["message"] = [markdown.markdown(process_slack_links(text)) for text in commit["message"]]
+
+    next_before = commits[-1]["ts"] if len(commits) == limit else None
+    return JsonResponse({"commits": commits, "next_before": next_before})
+
+
+# 저장소 순위. ?user= 가 있으면 해당 유저의 저장소별 활동
+def repositories_api(request, slug=None):
+    try:
+        limit = int_param(request, 'limit', 20, 1, 100)
+    except InvalidParameter as err:
+        return bad_request(err)
+
+    garden = get_garden(slug)
+    result = garden.get_repository_activity(user=request.GET.get('user'), limit=limit)
+    return JsonResponse(result, safe=False)
+
+
+# 커밋 메시지 검색. ?q=검색어&user=&repository=&start=YYYY-MM-DD&end=YYYY-MM-DD&page=1
+def search_api(request, slug=None):
+    keyword = request.GET.get('q', '')
+    try:
+        start = date_param(request, 'start')
+        end = date_param(request, 'end')
+        page = int_param(request, 'page', 1, 1)
+        limit = int_param(request, 'limit', 20, 1, 100)
+    except InvalidParameter as err:
+        return bad_request(err)
+
+    garden = get_garden(slug)
+    # 다음 페이지가 있는지 알기 위해 하나 더 조회
+    rows = garden.search_commits(
+        keyword,
+        user=request.GET.get('user'),
+        repository=request.GET.get('repository'),
+        start=start,
+        end=end,
+        limit=limit + 1,
+        offset=(page - 1) * limit
+    )
+
+    results = []
+    for row in rows[:limit]:
+        results.append({
+            "ts": row["ts"],
+            "user": row["github_username"],
+            "repository": row["repository"],
+            "datetime": row["datetime"],
+            "message": markdown.markdown(process_slack_links(row["text"] or "")),
+            "rank": row["rank"],
+        })
+
+    response = {"results": results, "page": page, "has_more": len(rows) > limit}
+    # 보관 후 지운 기간은 commit_search 에 없어서 검색되지 않음
+    manifest = archive.read_manifest(garden)
+    if manifest is not None and manifest.get("purged_at"):
+        response["archived"] = {"from": manifest["from"], "until": manifest["until"]}
+    return JsonResponse(response)
+
+
+# slack_messages 수집. 작업만 등록하고 바로 응답함 (처리는 attendance/cli_worker.py)
+def collect(request, slug=None):
     oldest = datetime.strptime(request.GET.get('start'), "%Y-%m-%d").timestamp()
     latest = datetime.strptime(request.GET.get('end'), "%Y-%m-%d").timestamp()
 
-    garden = Garden()
-    garden.collect_slack_messages(oldest, latest)
+    garden = get_garden(slug)
+    job_id = jobs.enqueue(garden, "collect", {"oldest": oldest, "latest": latest})
+    return job_response(garden, job_id)
+
+
+# 시즌 전체 출석부 csv. 작업 결과(result.csv)로 받음
+def csv(request, slug=None):
+    garden = get_garden(slug)
+    job_id = jobs.enqueue(garden, "csv")
+    return job_response(garden, job_id)
+
+
+def job_response(garden, job_id):
+    return JsonResponse({"job_id": job_id, "status_url": f"{base_path(garden)}api/jobs/{job_id}"}, status=202)
+
+
+# 작업 상태. status(queued, running, done, failed), progress, result
+def job_api(request, job_id, slug=None):
+    garden = get_garden(slug)
+    job = jobs.get_job(garden, job_id)
+    if job is None:
+        return JsonResponse({"error": "job not found"}, status=404)
+    return JsonResponse(job)
+
+
+# 출석부 변경분. ?since=<version>&limit=1000
+# since 이후에 추가/변경된 (유저, 날짜, 첫 출석 시간) 칸과 다음에 since 로 보낼 version
+def changes_api(request, slug=None):
+    try:
+        since = int_param(request, 'since', 0, 0)
+        limit = int_param(request, 'limit', 1000, 1, 5000)
+    except InvalidParameter as err:
+        return bad_request(err)
+
+    garden = get_garden(slug)
+    (changes, version) = garden.get_attendance_changes(since=since, limit=limit)
+    return JsonResponse({"version": version, "changes": changes, "has_more": len(changes) == limit})
 
-    return JsonResponse({})
 
+# 실시간 출석 (Server-Sent Events). 오늘 출석한 유저가 수집되면 바로 보내줌
+def live_api(request, slug=None):
+    garden = get_garden(slug)
+    response = StreamingHttpResponse(live.stream(garden), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # nginx 가 응답을 모았다가 보내지 않도록
+    response["X-Accel-Buffering"] = "no"
+    return response
 
-def csv(request):
-    garden = Garden()
-    garden.generate_attendance_csv()
 
-    return JsonResponse({})
+# 정원사 아바타. 크기별로 줄여서 저장해 둔 파일(hash 주소)로 redirect
+# AVATAR_DIR 이 없거나 원본을 받지 못하면 원본(GitHub) 주소로 redirect
+def avatar(request, user, size, slug=None):
+    garden = get_garden(slug)
+    if user not in garden.users or size not in avatars.SIZES:
+        raise Http404(f"avatar not found: {user}/{size}")
+
+    manifest = avatars.get(garden, user) if garden.avatar_dir else None
+    if manifest is None:
+        response = HttpResponseRedirect(avatars.origin_url(garden, user))
+        response["Cache-Control"] = "public, max-age=3600"
+        return response
+
+    response = HttpResponseRedirect(f"{base_path(garden)}avatars/{user}/{manifest['hash']}/{size}.{manifest['ext']}")
+    # 아바타가 바뀌면 hash 주소가 바뀌므로 redirect 는 짧게 캐시
+    response["Cache-Control"] = "public, max-age=3600"
+    return response
+
+
+# hash 주소의 아바타 파일. 내용이 바뀌지 않으므로 브라우저가 1년 동안 다시 묻지 않게 함
+def avatar_file(request, user, digest, size, ext, slug=None):
+    garden = get_garden(slug)
+    found = avatars.file_path(garden, user, digest, size) if garden.avatar_dir and user in garden.users else None
+    if found is None or not found[0].endswith(f".{ext}"):
+        raise Http404(f"avatar not found: {user}/{digest}/{size}.{ext}")
+
+    (path, content_type) = found
+    response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+# admission control 등급별 실행/대기 중인 요청 수, 실행/거절(429)/시간 초과(503) 횟수. 이 프로세스 기준
+def admission_api(request, slug=None):
+    controller = admission.get_controller()
+    if controller is None:
+        return JsonResponse({"enabled": False})
+    return JsonResponse(dict(enabled=True, **controller.snapshot()))
 
 
 # 특정일의 출석 데이터 불러오기
-def get(request, date):
-    garden = Garden()
+def get(request, date, slug=None):
+    garden = get_garden(slug)
     result = garden.get_attendance(datetime.strptime(date, "%Y%m%d").date())
     # pprint.pprint(result)
     return JsonResponse(result, safe=False)
@@ -103,20 +315,36 @@ def daterange(start_date, end_date):
 
 
 # 전체 출석부 조회
-def gets(request):
-    garden = Garden()
+def gets(request, slug=None):
+    garden = get_garden(slug)
 
     result = []
 
+    # 순위, 연속 출석일은 서버에서 계산
+    stats = {member.user: member for member in garden.get_stats()}
+
     users = garden.get_member()
     for user in users:
-        attendances = garden.find_attendance_by_user(user)
+        attendances = garden.get_attendance_by_user(user)
 
         # convert key type datetime.date to string
         for key_date in list(attendances.keys()).copy():
             formatted_date = key_date.strftime("%Y-%m-%d")
             attendances[formatted_date] = attendances.pop(key_date)[0]["ts"]
 
-        result.append({"user": user, "attendances": attendances})
+        result.append({
+            "user": user,
+            "attendances": attendances,
+            "rank": stats[user].rank,
+            "current_streak": stats[user].current_streak,
+            "longest_streak": stats[user].longest_streak,
+        })
+
+    return JsonResponse(result, safe=False)
+
 
+# 유저별 출석일수, 출석률, 순위, 연속 출석일, 미출석일
+def stats_api(request, slug=None):
+    garden = get_garden(slug)
+    result = [member.as_dict() for member in garden.get_stats()]
     return JsonResponse(result, safe=False)
\ No newline at end of file
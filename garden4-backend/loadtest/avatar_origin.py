@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+GitHub 아바타(avatars.githubusercontent.com) 로컬 대역
+
+유저마다 색이 다른 PNG(원본 크기 460px)를 만들어 ETag 와 같이 내려주고, If-None-Match 가 맞으면 304.
+요청 수를 세고, 응답 지연을 줄 수 있다. 아바타 교체는 POST /_origin/change/<user>
+
+    python loadtest/avatar_origin.py --port 8091 --latency-ms 300
+
+Garden 이 대역을 쓰게 하려면 AVATAR_ORIGIN=http://127.0.0.1:8091/
+요청 기록은 GET /_origin/requests
+"""
+
+import argparse
+import hashlib
+import json
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SIZE = 460
+
+
+def png(width, height, rgb):
+    # 한 가지 색 PNG. Pillow 없이 만듦
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    row = b"\x00" + bytes(rgb) * width
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(row * height))
+        + chunk(b"IEND", b"")
+    )
+
+
+class AvatarOrigin:
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self.versions = Counter()
+        self.requests = Counter()
+        self.not_modified = Counter()
+        self.lock = threading.Lock()
+
+    def image(self, user):
+        with self.lock:
+            version = self.versions[user]
+        digest = hashlib.sha256(f"{user}:{version}".encode()).digest()
+        content = png(SIZE, SIZE, digest[:3])
+        return (content, f'"{hashlib.sha256(content).hexdigest()[:16]}"')
+
+    def change(self, user):
+        with self.lock:
+            self.versions[user] += 1
+
+    def status(self):
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "not_modified": dict(self.not_modified),
+                "total": sum(self.requests.values()),
+            }
+
+
+def make_handler(origin):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def respond(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for (name, value) in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/_origin/requests":
+                self.respond(200, json.dumps(origin.status()).encode(), {"Content-Type": "application/json"})
+                return
+
+            user = path.strip("/")
+            if not user or "/" in user:
+                self.respond(404)
+                return
+            if origin.latency_ms:
+                time.sleep(origin.latency_ms / 1000)
+
+            (content, etag) = origin.image(user)
+            with origin.lock:
+                origin.requests[user] += 1
+                if self.headers.get("If-None-Match") == etag:
+                    origin.not_modified[user] += 1
+            if self.headers.get("If-None-Match") == etag:
+                self.respond(304, headers={"ETag": etag})
+                return
+            self.respond(200, content, {"Content-Type": "image/png", "ETag": etag, "Cache-Control": "max-age=300"})
+
+        def do_POST(self):
+            path = self.path.split("?")[0]
+            if path.startswith("/_origin/change/"):
+                origin.change(path[len("/_origin/change/"):])
+                self.respond(204)
+            else:
+                self.respond(404)
+
+    return Handler
+
+
+def start(origin, port=0):
+    # 테스트에서 같은 프로세스로 띄울 때 사용. (server, origin_url) 을 돌려줌
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(origin))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GitHub 아바타 로컬 대역")
+    parser.add_argument('--port', type=int, default=8091)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    origin = AvatarOrigin(latency_ms=args.latency_ms)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(origin))
+    print(f"avatar origin: http://127.0.0.1:{args.port}/")
+    server.serve_forever()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+수집(collect_slack_messages) 처리량 벤치마크
+
+로컬 PostgreSQL 의 garden4 스키마를 비우고, Slack emulator 를 같은 프로세스에 띄운 뒤
+덤프 전체 구간을 수집해서 걸린 시간, 초당 메시지 수, Slack 호출/재시도/대기 시간을 출력한다.
+네트워크 없이 돌아가므로 수집 로직 변경 전후 비교에 사용.
+
+    DB_HOST=localhost DB_USER=postgres DB_PASSWORD=postgres \\
+        python loadtest/bench_collect.py --latency-ms 30 --rate-limit 50 --concurrent 2
+
+주의: garden4 스키마를 지우고 다시 만든다. 로컬 DB 에서만 실행할 것
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+import django
+
+from loadtest import slack_emulator
+from loadtest.run import write_config
+from loadtest.seed_local_db import connect, seed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="수집 처리량 벤치마크")
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--rate-limit', type=int, default=0, help="emulator 의 메소드별 분당 허용 호출수")
+    parser.add_argument('--concurrent', type=int, default=1, help="같은 구간 수집을 동시에 몇 번 실행할지 (coalescing 확인용)")
+    args = parser.parse_args()
+
+    conn = connect()
+    seed(conn, scale=0, reset=True)
+    conn.close()
+
+    messages = slack_emulator.load_messages()
+    emulator = slack_emulator.SlackEmulator(messages, latency_ms=args.latency_ms, rate_limit=args.rate_limit)
+    (server, base_url) = slack_emulator.start(emulator)
+
+    config_dir = tempfile.mkdtemp(prefix='garden4-bench-')
+    write_config(config_dir, ['junho85'], '2019-10-01', 100)
+    os.environ['GARDEN_CONFIG_DIR'] = config_dir
+    os.environ['SLACK_API_BASE_URL'] = base_url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+    django.setup()
+
+    from attendance.garden import Garden
+
+    garden = Garden()
+    oldest = min(float(message["ts"]) for message in messages) - 1
+    latest = max(float(message["ts"]) for message in messages) + 1
+
+    # 같은 구간을 동시에 수집하면 Slack 호출은 한 번만 일어나야 함
+    def collect():
+        garden.collect_slack_messages(oldest, latest)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=collect) for _ in range(args.concurrent)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM garden4.slack_messages")
+    stored = cursor.fetchone()[0]
+    conn.close()
+    server.shutdown()
+
+    print(f"messages in dump : {len(messages)}")
+    print(f"stored           : {stored}")
+    print(f"elapsed          : {elapsed:.2f}s ({stored / elapsed:.0f} messages/s)")
+    print(f"slack client     : {garden.slack_client.get_stats()}")
+    print(f"emulator         : {emulator.status()['counters']}")
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+출석부 SQL 실행계획 회귀 테스트
+
+로컬 PostgreSQL 에 덤프를 여러 크기(--scales)로 넣고, Garden 의 조회 메소드들을 실제로 호출하면서
+실행된 쿼리를 모아 EXPLAIN (ANALYZE, BUFFERS) 로 다시 실행한다. 다음 경우 실패로 보고 exit code 1 로 끝난다.
+
+- 큰 테이블(--seqscan-min-rows 이상)을 Seq Scan 으로 읽음
+- 읽은 buffer(shared hit + read) 가 예산(--base-buffers + --buffers-per-row * 처리한 row 수)을 넘음
+  처리한 row 수는 실행계획 노드 중 가장 많은 Actual Rows. (검색처럼 전부 정렬한 뒤 LIMIT 하는 쿼리는 정렬한 row 수)
+  filter 로 버려지는 row 가 많거나 heap 을 쓸데없이 많이 읽으면 예산을 넘는다
+
+    DB_HOST=localhost DB_USER=postgres DB_PASSWORD=postgres python loadtest/check_query_plans.py --scales 1,20
+
+주의: garden4 스키마를 지우고 다시 만든다. 로컬 DB 에서만 실행할 것
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
+
+import psycopg2
+import psycopg2.extensions
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+import django
+
+from loadtest.run import dump_users, write_config
+from loadtest.seed_local_db import connect, seed
+
+_capturing_cursors = {}
+
+
+def capturing_cursor(factory):
+    # 원래 cursor_factory(RealDictCursor 등) 는 유지하면서 실행한 쿼리를 connection.captured 에 남김
+    if factory not in _capturing_cursors:
+        class CapturingCursor(factory):
+            def execute(self, query, vars=None):
+                self.connection.captured.append(self.mogrify(query, vars).decode())
+                return super().execute(query, vars)
+
+        _capturing_cursors[factory] = CapturingCursor
+    return _capturing_cursors[factory]
+
+
+class CapturingConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.captured = []
+        CapturingConnection.connections.append(self)
+
+    def cursor(self, *args, **kwargs):
+        kwargs['cursor_factory'] = capturing_cursor(kwargs.get('cursor_factory') or psycopg2.extensions.cursor)
+        return super().cursor(*args, **kwargs)
+
+
+CapturingConnection.connections = []
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from walk(child)
+
+
+def check_plan(conn, query, table_rows, seqscan_min_rows, base_buffers, buffers_per_row):
+    cursor = conn.cursor()
+    cursor.execute("SET search_path TO garden4")
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query)
+    plan = cursor.fetchone()[0][0]['Plan']
+    # EXPLAIN ANALYZE 는 쿼리를 실제로 실행하므로 (FOR UPDATE 등) 되돌림
+    conn.rollback()
+    cursor.close()
+
+    problems = []
+    for node in walk(plan):
+        relation = node.get('Relation Name')
+        if node['Node Type'] == 'Seq Scan' and table_rows.get(relation, 0) >= seqscan_min_rows:
+            problems.append(f"Seq Scan on {relation} ({table_rows[relation]} rows)")
+
+    buffers = plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0)
+    rows = max(node.get('Actual Rows', 0) * node.get('Actual Loops', 1) for node in walk(plan))
+    budget = base_buffers + buffers_per_row * rows
+    if buffers > budget:
+        problems.append(f"buffers {buffers} > budget {budget}")
+
+    return plan, buffers, problems
+
+
+def find_commits_with_archive(garden, user, manifest):
+    # 보관본이 있을 때의 DB 쿼리만 확인. Parquet 은 읽지 않음
+    from attendance import archive
+
+    with mock.patch.object(archive, 'read_manifest', return_value=manifest), \
+            mock.patch.object(archive, 'commits_by_user', return_value=[]):
+        return garden.find_commits_by_user(user, limit=50)
+
+
+def scenarios(garden, user):
+    # Garden 이 실제로 날리는 조회 쿼리들
+    from attendance import jobs
+
+    gardening_date = garden.start_date + timedelta(days=30)
+    oldest = datetime.combine(gardening_date, datetime.min.time())
+    commits = garden.find_commits_by_user(user, limit=50)
+    # 시즌 앞 30일을 보관했다고 치고 나머지를 DB 에서 읽는 경우
+    manifest = {"from": datetime.combine(garden.start_date, datetime.min.time()), "until": oldest}
+    (_, version) = garden.get_attendance_changes(limit=1000000)
+
+    checks = [
+        ("find_attendance_by_user", lambda: garden.find_attendance_by_user(user)),
+        ("find_attendance_by_user(since)", lambda: garden.find_attendance_by_user(user, since=oldest)),
+        ("iter_db_attends_by_user(archive)", lambda: list(garden.iter_db_attends_by_user(user, None, manifest))),
+        ("find_commits_by_user", lambda: garden.find_commits_by_user(user, limit=50)),
+        ("find_commits_by_user(archive)", lambda: find_commits_with_archive(garden, user, manifest)),
+        ("find_attend", lambda: list(garden.find_attend(oldest.timestamp(), (oldest + timedelta(days=1)).timestamp()))),
+        ("search_commits", lambda: garden.search_commits("TIL", limit=20)),
+        ("search_commits(user)", lambda: garden.search_commits("commit", user=user, limit=20)),
+        ("get_repository_activity", lambda: garden.get_repository_activity(limit=20)),
+        ("get_repository_activity(user)", lambda: garden.get_repository_activity(user=user, limit=20)),
+        ("get_attendance_changes", lambda: garden.get_attendance_changes(limit=1000)),
+        ("get_attendance_changes(since)", lambda: garden.get_attendance_changes(since=version // 2, limit=1000)),
+        ("record_attendance_changes", lambda: garden.record_attendance_changes([user])),
+        ("jobs.claim", lambda: jobs.claim(garden, "check_query_plans")),
+    ]
+    # 커밋이 없는 유저면 다음 페이지 쿼리는 건너뜀
+    if commits:
+        checks.insert(4, ("find_commits_by_user(before)", lambda: garden.find_commits_by_user(user, before=commits[-1]["ts"], limit=50)))
+    else:
+        print(f"skip find_commits_by_user(before): {user} has no commits")
+    return checks
+
+
+def table_row_counts(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT relname, n_live_tup FROM pg_stat_user_tables WHERE schemaname = 'garden4'
+    """)
+    counts = dict(cursor.fetchall())
+    cursor.close()
+    return counts
+
+
+def run_scale(scale, args):
+    conn = connect()
+    seed(conn, scale=scale, reset=True)
+
+    from attendance.garden import Garden
+
+    garden = Garden()
+    garden.connect_postgres = lambda readonly=False: connect_capturing(garden)
+    user = args.user
+    # 변경분 로그(attendance_changes) 를 처음 수집할 때처럼 채워둠
+    garden.record_attendance_changes(garden.users)
+    table_rows = table_row_counts(conn)
+
+    failures = 0
+    print(f"\n== scale {scale} (slack_messages {table_rows.get('slack_messages', 0)} rows)")
+    for (name, call) in scenarios(garden, user):
+        CapturingConnection.connections = []
+        call()
+        queries = [
+            query
+            for connection in CapturingConnection.connections
+            for query in connection.captured
+            if not query.startswith("SET ")
+        ]
+        for query in queries:
+            (plan, buffers, problems) = check_plan(
+                conn, query, table_rows, args.seqscan_min_rows, args.base_buffers, args.buffers_per_row
+            )
+            status = "FAIL" if problems else "ok"
+            print(f"{status:<4} {name:<32} {plan['Node Type']:<20} rows={plan.get('Actual Rows', 0):<6} "
+                  f"buffers={buffers:<6} {plan.get('Actual Total Time', 0):.2f}ms")
+            for problem in problems:
+                print(f"     - {problem}")
+            if problems:
+                failures += 1
+                if args.verbose:
+                    print(json.dumps(plan, indent=2))
+    conn.close()
+    return failures
+
+
+def connect_capturing(garden):
+    conn = psycopg2.connect(
+        host=garden.pg_host,
+        port=garden.pg_port,
+        database=garden.pg_database,
+        user=garden.pg_user,
+        password=garden.pg_password,
+        sslmode=garden.pg_sslmode,
+        connection_factory=CapturingConnection,
+    )
+    cursor = conn.cursor()
+    cursor.execute(f"SET search_path TO {garden.pg_schema}")
+    cursor.close()
+    return conn
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="출석부 SQL 실행계획 회귀 테스트")
+    parser.add_argument('--scales', default='1,20', help="덤프를 몇 벌 넣고 확인할지. 예) 1,20")
+    parser.add_argument('--user', default='junho85')
+    parser.add_argument('--seqscan-min-rows', type=int, default=10000, help="이 row 수 이상인 테이블의 Seq Scan 은 실패")
+    parser.add_argument('--base-buffers', type=int, default=200)
+    parser.add_argument('--buffers-per-row', type=int, default=4)
+    parser.add_argument('--verbose', action='store_true', help="실패한 쿼리의 실행계획 출력")
+    args = parser.parse_args()
+
+    config_dir = tempfile.mkdtemp(prefix='garden4-plans-')
+    write_config(config_dir, dump_users(os.path.join(BACKEND_DIR, 'archive', '20250622_mongodb_dump', 'garden', 'slack_messages.json'), 30), '2019-10-01', 100)
+    os.environ['GARDEN_CONFIG_DIR'] = config_dir
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+    django.setup()
+
+    failures = sum(run_scale(int(scale), args) for scale in args.scales.split(','))
+    print(f"\n{failures} failed")
+    sys.exit(1 if failures else 0)
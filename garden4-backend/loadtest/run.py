@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+출석부 HTTP 부하 테스트
+
+로컬 PostgreSQL(seed_local_db.py 로 채운 DB) 을 바라보는 Django 서버를 띄우고
+실제 트래픽과 비슷한 비율로 요청을 보내서 endpoint 별 처리량, p50/p95/p99 지연시간, 에러율을 출력한다.
+
+    DB_HOST=localhost DB_USER=postgres DB_PASSWORD=postgres \\
+        python loadtest/run.py --concurrency 20 --duration 60
+
+이미 떠 있는 서버를 대상으로 하려면 --url http://localhost:8004 (서버 실행은 건너뜀)
+"""
+
+import argparse
+import collections
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from attendance.dump import DEFAULT_DUMP_PATH, read_dump
+
+# (이름, 경로, 비중). 경로의 {user}, {date} 는 요청마다 채움
+DEFAULT_MIX = [
+    ("index", "/attendance/", 30),
+    ("users", "/attendance/users/", 20),
+    ("gets", "/attendance/gets", 25),
+    ("get_date", "/attendance/get/{date}", 10),
+    ("user_api", "/attendance/api/users/{user}/", 15),
+]
+
+
+def dump_users(dump_path, count):
+    # 덤프에서 커밋이 많은 github 유저 순으로 (bot 제외)
+    counter = collections.Counter()
+    for document in read_dump(dump_path):
+        for attachment in document.get('attachments') or []:
+            author = attachment.get('author_name')
+            if author and not author.endswith('[bot]') and author != 'utterances-bot':
+                counter[author] += 1
+    return [user for (user, _) in counter.most_common(count)]
+
+
+def write_config(config_dir, users, start_date, gardening_days):
+    with open(os.path.join(config_dir, 'config.ini'), 'w') as file:
+        file.write(f"""[DEFAULT]
+SLACK_API_TOKEN = xoxb-loadtest
+CHANNEL_ID = CLOADTEST
+GARDENING_DAYS = {gardening_days}
+START_DATE = {start_date}
+
+[POSTGRESQL]
+DATABASE = {os.getenv('DB_NAME', 'postgres')}
+HOST = {os.getenv('DB_HOST', 'localhost')}
+PORT = {os.getenv('DB_PORT', '5432')}
+USER = {os.getenv('DB_USER', 'postgres')}
+PASSWORD = {os.getenv('DB_PASSWORD', 'postgres')}
+SCHEMA = garden4
+SSLMODE = {os.getenv('DB_SSLMODE', 'disable')}
+
+[GITHUB]
+USERS = {','.join(users)}
+""")
+    with open(os.path.join(config_dir, 'users.yaml'), 'w') as file:
+        for user in users:
+            file.write(f"{user}:\n  slack: {user}\n")
+
+
+def start_server(port, config_dir, server_cmd):
+    env = dict(os.environ, GARDEN_CONFIG_DIR=config_dir, DEBUG='False')
+    if server_cmd:
+        command = server_cmd.format(port=port).split()
+    else:
+        command = [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}']
+    # 서버 로그는 설정 디렉토리에 남김
+    log = open(os.path.join(config_dir, 'server.log'), 'w')
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    # 서버가 뜰 때까지 대기
+    url = f"http://127.0.0.1:{port}/attendance/users/"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return process
+        except (urllib.error.URLError, ConnectionError):
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited. see {log.name}")
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("server did not start")
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        # admission control 이 거절한 요청(429, 503). errors 에도 포함됨
+        self.shed = collections.Counter()
+
+    def record(self, name, latency, ok, shed=False):
+        with self.lock:
+            self.latencies[name].append(latency)
+            if not ok:
+                self.errors[name] += 1
+            if shed:
+                self.shed[name] += 1
+
+    def report(self, elapsed):
+        print(f"{'endpoint':<10} {'requests':>9} {'rps':>8} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} {'errors':>8} {'shed':>7}")
+        names = sorted(self.latencies)
+        for name in names + ['total']:
+            if name == 'total':
+                values = sorted(value for name in names for value in self.latencies[name])
+                errors = sum(self.errors.values())
+                shed = sum(self.shed.values())
+            else:
+                values = sorted(self.latencies[name])
+                errors = self.errors[name]
+                shed = self.shed[name]
+            print(f"{name:<10} {len(values):>9} {len(values) / elapsed:>8.1f} "
+                  f"{percentile(values, 50) * 1000:>9.1f} {percentile(values, 95) * 1000:>9.1f} "
+                  f"{percentile(values, 99) * 1000:>9.1f} {errors / max(len(values), 1):>7.1%} {shed / max(len(values), 1):>6.1%}")
+
+
+def worker(base_url, mix, users, dates, deadline, recorder, timeout):
+    names = [name for (name, _, _) in mix]
+    paths = {name: path for (name, path, _) in mix}
+    weights = [weight for (_, _, weight) in mix]
+
+    while time.monotonic() < deadline:
+        name = random.choices(names, weights)[0]
+        path = paths[name].format(user=random.choice(users), date=random.choice(dates))
+        started = time.monotonic()
+        shed = False
+        try:
+            with urllib.request.urlopen(base_url + path, timeout=timeout) as response:
+                response.read()
+                ok = response.status < 400
+        except urllib.error.HTTPError as e:
+            ok = False
+            shed = e.code in (429, 503)
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            ok = False
+        recorder.record(name, time.monotonic() - started, ok, shed)
+
+
+def run(base_url, concurrency, duration, mix, users, dates, timeout):
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=worker, args=(base_url, mix, users, dates, deadline, recorder, timeout))
+        for _ in range(concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.report(time.monotonic() - started)
+    return recorder
+
+
+def parse_mix(value):
+    # gets=50,index=50 처럼 비중만 바꿀 수 있음
+    weights = dict(item.split('=') for item in value.split(','))
+    return [(name, path, int(weights.get(name, 0))) for (name, path, _) in DEFAULT_MIX if int(weights.get(name, 0)) > 0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="출석부 HTTP 부하 테스트")
+    parser.add_argument('--url', help="이미 떠 있는 서버 주소. 없으면 runserver 를 띄움")
+    parser.add_argument('--server-cmd', help="서버 실행 명령. 예) 'gunicorn -w 4 -b 127.0.0.1:{port} mysite.wsgi'")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30, help="초")
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help="예) index=30,users=20,gets=25,get_date=10,user_api=15")
+    parser.add_argument('--users', type=int, default=30, help="덤프에서 가져올 정원사 수")
+    parser.add_argument('--start-date', default='2019-10-01')
+    parser.add_argument('--gardening-days', type=int, default=100)
+    parser.add_argument('--dump', default=DEFAULT_DUMP_PATH)
+    args = parser.parse_args()
+
+    users = dump_users(args.dump, args.users)
+    start = datetime.strptime(args.start_date, "%Y-%m-%d").date()
+    dates = [(start + timedelta(days=day)).strftime("%Y%m%d") for day in range(args.gardening_days)]
+
+    server = None
+    base_url = args.url
+    config_dir = tempfile.mkdtemp(prefix='garden4-loadtest-')
+    if not base_url:
+        write_config(config_dir, users, args.start_date, args.gardening_days)
+        server = start_server(args.port, config_dir, args.server_cmd)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        print(f"{base_url} concurrency={args.concurrency} duration={args.duration}s users={len(users)}")
+        run(base_url, args.concurrency, args.duration, args.mix, users, dates, args.timeout)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
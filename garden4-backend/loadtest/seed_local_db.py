@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+로컬 PostgreSQL 에 garden4 스키마를 만들고 archive 덤프로 slack_messages 를 채운다.
+
+    DB_HOST=localhost DB_USER=postgres DB_PASSWORD=postgres python loadtest/seed_local_db.py --reset --scale 10
+
+--scale N 이면 덤프를 N 벌 복사해서 넣음. 복사본은 1년씩 뒤로 밀어서 여러 시즌이 쌓인 것처럼 만든다.
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from datetime import timedelta
+from decimal import Decimal
+
+import psycopg2
+import psycopg2.extras
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from attendance.dump import DEFAULT_DUMP_PATH, read_dump
+
+SCHEMA_PATH = os.path.join(BACKEND_DIR, 'archive', 'migration', 'supabase_schema.sql')
+SQL_DIR = os.path.join(BACKEND_DIR, 'sql')
+SEASON_SHIFT = timedelta(days=365)
+
+
+def connect(dbname=None):
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432'),
+        database=dbname or os.getenv('DB_NAME', 'postgres'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', 'postgres'),
+        sslmode=os.getenv('DB_SSLMODE', 'disable'),
+    )
+
+
+def base_schema_sql():
+    # RLS 정책은 Supabase 의 auth.role() 이 필요하므로 로컬에서는 제외
+    with open(SCHEMA_PATH, encoding='utf-8') as file:
+        sql = file.read()
+    return sql.split('-- RLS')[0]
+
+
+def message_rows(dump_path, scale):
+    documents = list(read_dump(dump_path))
+    for copy in range(scale):
+        shift = SEASON_SHIFT * copy
+        for document in documents:
+            ts = Decimal(document['ts']) + Decimal(int(shift.total_seconds()))
+            # Supabase 로 옮길 때 KST 환경에서 변환되어 ts_for_db 는 KST+9시간 으로 저장되어 있음
+            ts_for_db = document['ts_for_db'] + timedelta(hours=9) + shift
+            yield (
+                f"{ts:.6f}",
+                ts_for_db,
+                document.get('bot_id'),
+                document.get('type'),
+                document.get('text'),
+                document.get('user'),
+                document.get('team'),
+                json.dumps(document['bot_profile']) if document.get('bot_profile') else None,
+                json.dumps(document['attachments']) if document.get('attachments') else None,
+            )
+
+
+def seed(conn, dump_path=DEFAULT_DUMP_PATH, scale=1, reset=False):
+    cursor = conn.cursor()
+
+    if reset:
+        cursor.execute("DROP SCHEMA IF EXISTS garden4 CASCADE")
+    cursor.execute(base_schema_sql())
+    conn.commit()
+
+    cursor.execute("SET search_path TO garden4")
+    psycopg2.extras.execute_values(cursor, """
+        INSERT INTO slack_messages (ts, ts_for_db, bot_id, type, text, "user", team, bot_profile, attachments)
+        VALUES %s
+        ON CONFLICT (ts) DO NOTHING
+    """, message_rows(dump_path, scale), page_size=1000)
+    conn.commit()
+
+    # 추가 스키마는 기존 데이터를 backfill 하므로 데이터를 넣은 뒤에 적용
+    for path in sorted(glob.glob(os.path.join(SQL_DIR, '*.sql'))):
+        print(f"apply {os.path.basename(path)}")
+        with open(path, encoding='utf-8') as file:
+            cursor.execute(file.read())
+        conn.commit()
+
+    # migration(sql/005 등)이 UPDATE 로 남긴 dead tuple 을 정리하고 ts 순서로 다시 씀. 운영에서도 적용 후 같은 CLUSTER 를 실행함
+    conn.autocommit = True
+    cursor.execute("CLUSTER garden4.slack_messages USING slack_messages_ts_key")
+    cursor.execute("ANALYZE")
+    conn.autocommit = False
+
+    cursor.execute("SELECT COUNT(*) FROM slack_messages")
+    count = cursor.fetchone()[0]
+    cursor.close()
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="로컬 PostgreSQL 에 덤프 데이터 넣기")
+    parser.add_argument('--dump', default=DEFAULT_DUMP_PATH)
+    parser.add_argument('--scale', type=int, default=1, help="덤프를 몇 벌 넣을지 (1년씩 밀어서)")
+    parser.add_argument('--reset', action='store_true', help="garden4 스키마를 지우고 새로 만듦")
+    args = parser.parse_args()
+
+    conn = connect()
+    count = seed(conn, args.dump, args.scale, args.reset)
+    conn.close()
+    print(f"slack_messages: {count} rows")
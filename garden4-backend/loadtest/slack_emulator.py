@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Slack Web API 로컬 대역
+
+archive 덤프로 conversations.history 를 흉내내고 chat.postMessage 호출을 기록한다.
+oldest/latest/inclusive/limit/cursor 는 실제 API 와 같은 방식으로 동작하고,
+응답 지연과 429 rate limit 을 설정할 수 있다.
+
+    python loadtest/slack_emulator.py --port 8090 --latency-ms 50 --rate-limit 50
+
+Garden 이 emulator 를 쓰게 하려면 SLACK_API_BASE_URL=http://127.0.0.1:8090/api/
+기록된 호출은 GET /_emulator/calls 로 확인
+"""
+
+import argparse
+import base64
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from attendance.dump import DEFAULT_DUMP_PATH, read_dump
+
+
+class SlackEmulator:
+    def __init__(self, messages, latency_ms=0, jitter_ms=0, rate_limit=0):
+        # conversations.history 는 최신 메시지부터 돌려줌
+        self.messages = sorted(messages, key=lambda message: Decimal(message["ts"]), reverse=True)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit  # 메소드별 분당 허용 호출수. 0 이면 제한 없음
+        self.lock = threading.Lock()
+        self.recent_calls = defaultdict(deque)
+        self.counters = defaultdict(int)
+        self.posted_messages = []
+
+    def retry_after(self, method):
+        """
+        최근 1분간 호출수가 rate_limit 을 넘으면 다시 호출할 수 있을 때까지 남은 초, 아니면 0
+        """
+        now = time.monotonic()
+        with self.lock:
+            calls = self.recent_calls[method]
+            while calls and calls[0] <= now - 60:
+                calls.popleft()
+            if self.rate_limit and len(calls) >= self.rate_limit:
+                self.counters[f"{method}:429"] += 1
+                return max(1, math.ceil(calls[0] + 60 - now))
+            calls.append(now)
+            self.counters[method] += 1
+            return 0
+
+    def sleep(self):
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+
+    def conversations_history(self, params):
+        oldest = Decimal(params.get("oldest") or "0")
+        latest = Decimal(params.get("latest") or str(time.time()))
+        inclusive = params.get("inclusive") in ("1", "true", "True")
+        limit = min(int(params.get("limit") or 100), 1000)
+        # cursor 는 다음 페이지 첫 메시지의 위치
+        cursor = params.get("cursor")
+        offset = int(base64.b64decode(cursor).decode()) if cursor else 0
+
+        def in_range(message):
+            ts = Decimal(message["ts"])
+            if inclusive:
+                return oldest <= ts <= latest
+            return oldest < ts < latest
+
+        matched = [message for message in self.messages if in_range(message)]
+        page = matched[offset:offset + limit]
+        has_more = offset + limit < len(matched)
+
+        body = {"ok": True, "messages": page, "has_more": has_more, "pin_count": 0}
+        if has_more:
+            next_cursor = base64.b64encode(str(offset + limit).encode()).decode()
+            body["response_metadata"] = {"next_cursor": next_cursor}
+        return body
+
+    def chat_post_message(self, params):
+        ts = f"{time.time():.6f}"
+        with self.lock:
+            self.posted_messages.append(dict(params, ts=ts))
+        return {"ok": True, "channel": params.get("channel"), "ts": ts, "message": {"text": params.get("text"), "ts": ts}}
+
+    def users_list(self, params):
+        authors = sorted({
+            attachment.get("author_name")
+            for message in self.messages
+            for attachment in message.get("attachments") or []
+            if attachment.get("author_name")
+        })
+        members = [{"id": f"U{index:08d}", "name": author} for (index, author) in enumerate(authors)]
+        return {"ok": True, "members": members}
+
+    def handle(self, method, params):
+        handlers = {
+            "conversations.history": self.conversations_history,
+            "chat.postMessage": self.chat_post_message,
+            "users.list": self.users_list,
+            "auth.test": lambda params: {"ok": True, "user_id": "UEMULATOR", "team_id": "TEMULATOR"},
+        }
+        if method not in handlers:
+            return 200, {"ok": False, "error": "unknown_method"}, {}
+        retry_after = self.retry_after(method)
+        if retry_after:
+            return 429, {"ok": False, "error": "ratelimited"}, {"Retry-After": str(retry_after)}
+        self.sleep()
+        return 200, handlers[method](params), {}
+
+    def status(self):
+        with self.lock:
+            return {"counters": dict(self.counters), "posted_messages": list(self.posted_messages)}
+
+
+def make_handler(emulator):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def read_params(self):
+            url = urlparse(self.path)
+            params = dict(parse_qsl(url.query))
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                body = self.rfile.read(length).decode()
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    params.update(json.loads(body))
+                else:
+                    params.update(parse_qsl(body))
+            return url.path, params
+
+        def respond(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for (name, value) in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def dispatch(self):
+            (path, params) = self.read_params()
+            if path == "/_emulator/calls":
+                self.respond(200, emulator.status())
+            elif path.startswith("/api/"):
+                self.respond(*emulator.handle(path[len("/api/"):], params))
+            else:
+                self.respond(404, {"ok": False, "error": "not_found"})
+
+        do_GET = dispatch
+        do_POST = dispatch
+
+    return Handler
+
+
+def shift_to_now(messages):
+    # 덤프의 마지막 메시지가 지금 시각이 되도록 ts 를 옮김
+    shift = Decimal(f"{time.time():.6f}") - max(Decimal(message["ts"]) for message in messages)
+    for message in messages:
+        message["ts"] = f"{Decimal(message['ts']) + shift:.6f}"
+    return messages
+
+
+def load_messages(dump_path=DEFAULT_DUMP_PATH, now=False):
+    messages = []
+    for document in read_dump(dump_path):
+        document.pop("ts_for_db", None)
+        messages.append(document)
+    return shift_to_now(messages) if now else messages
+
+
+def start(emulator, port=0):
+    # 테스트/벤치마크에서 같은 프로세스로 띄울 때 사용. (server, base_url) 을 돌려줌
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(emulator))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Slack Web API 로컬 대역")
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--dump', default=DEFAULT_DUMP_PATH)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--rate-limit', type=int, default=0, help="메소드별 분당 허용 호출수 (0: 제한 없음)")
+    parser.add_argument('--now', action='store_true', help="덤프의 마지막 메시지가 지금이 되도록 ts 를 옮김")
+    args = parser.parse_args()
+
+    emulator = SlackEmulator(
+        load_messages(args.dump, args.now),
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_limit=args.rate_limit,
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(emulator))
+    print(f"slack emulator: http://127.0.0.1:{args.port}/api/ ({len(emulator.messages)} messages)")
+    server.serve_forever()
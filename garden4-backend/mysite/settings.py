@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # 무거운 요청 동시 실행 제한 (attendance/admission.py)
+    'attendance.admission.AdmissionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -83,6 +85,58 @@ DATABASES = {
 }
 
 
+# Cache
+# 수집은 별도 프로세스(cli_collect.py, cli_worker.py, garden_scheduler)에서 하므로
+# 캐시 무효화와 replica 의 WAL 위치가 웹 프로세스에 전달되도록 REDIS_URL 을 설정.
+# 없으면 프로세스 로컬 메모리. 개발용이며 system check 경고(attendance.W001)가 나옴 (attendance/checks.py)
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'garden4',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# 오늘 출석 데이터 캐시 유지 시간(초). 지난 날짜들은 수집으로 무효화되기 전까지 유지됨
+ATTENDANCE_CACHE_TIMEOUT = int(os.getenv('ATTENDANCE_CACHE_TIMEOUT', '60'))
+
+
+# Admission control (attendance/admission.py)
+# 프로세스 하나의 동시 실행 수. 0 이면 제한하지 않음. 그 중 무거운 요청이 쓰지 못하고 나머지 요청 몫으로 남겨둘 수
+ADMISSION_MAX_CONCURRENCY = int(os.getenv('ADMISSION_MAX_CONCURRENCY', '16'))
+ADMISSION_RESERVED = int(os.getenv('ADMISSION_RESERVED', '4'))
+# 자리를 기다리는 최대 시간(초). 지나면 503. 429/503 응답의 Retry-After(초)
+ADMISSION_MAX_WAIT = float(os.getenv('ADMISSION_MAX_WAIT', '5'))
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '10'))
+# 등급별 view 이름, 동시 실행 수, 대기열 길이. 어느 등급에도 없는 view 는 default
+ADMISSION_CLASSES = {
+    # 모든 유저의 출석부를 계산함
+    'gets': {
+        'views': ('gets', 'stats_api'),
+        'concurrency': int(os.getenv('ADMISSION_GETS_CONCURRENCY', '2')),
+        'queue': int(os.getenv('ADMISSION_GETS_QUEUE', '8')),
+    },
+    # 작업 등록 (수집, csv). 처리는 worker 가 하지만 몰리면 같은 작업이 쌓임
+    'jobs': {
+        'views': ('collect', 'csv'),
+        'concurrency': int(os.getenv('ADMISSION_JOBS_CONCURRENCY', '1')),
+        'queue': int(os.getenv('ADMISSION_JOBS_QUEUE', '2')),
+    },
+    'default': {
+        'queue': int(os.getenv('ADMISSION_DEFAULT_QUEUE', '64')),
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
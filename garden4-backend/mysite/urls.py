@@ -20,5 +20,7 @@ from django.views.generic import RedirectView
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('attendance/', include('attendance.urls')),
+    # 다른 정원(시즌/채널). config.ini 의 [GARDEN:<slug>]
+    path('<slug:slug>/attendance/', include('attendance.urls', namespace='garden')),
     path('', RedirectView.as_view(url="/attendance/")),
 ]
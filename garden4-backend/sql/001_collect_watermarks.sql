@@ -0,0 +1,14 @@
+-- 증분 수집용 watermark 테이블
+-- 채널별로 마지막으로 저장한 slack message ts 를 기록함
+SET search_path TO garden4;
+
+CREATE TABLE IF NOT EXISTS collect_watermarks (
+    channel_id VARCHAR(20) PRIMARY KEY,
+    last_ts NUMERIC(20, 6) NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- 기존 데이터로 watermark 초기화 (CHANNEL_ID 는 config.ini 의 값으로 바꿔서 실행)
+-- INSERT INTO collect_watermarks (channel_id, last_ts)
+-- SELECT 'CHANNEL_ID', MAX(ts::numeric) FROM slack_messages
+-- ON CONFLICT (channel_id) DO NOTHING;
@@ -0,0 +1,39 @@
+-- 커밋 메시지 검색용 테이블
+-- slack_messages.attachments 의 attachment 하나당 한 row. 수집(insert_slack_messages)시 함께 저장됨
+SET search_path TO garden4;
+
+CREATE TABLE IF NOT EXISTS commit_search (
+    ts VARCHAR(20) NOT NULL REFERENCES slack_messages (ts) ON DELETE CASCADE,
+    idx SMALLINT NOT NULL,
+    github_username VARCHAR(100),
+    repository TEXT,
+    text TEXT,
+    ts_for_db TIMESTAMP NOT NULL,
+    -- 한글/영문이 섞여 있으므로 형태소 분석 없이 simple 설정 사용 (검색은 prefix 매칭)
+    document TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', COALESCE(text, '')), 'A') ||
+        setweight(to_tsvector('simple', COALESCE(repository, '')), 'B')
+    ) STORED,
+    PRIMARY KEY (ts, idx)
+);
+
+CREATE INDEX IF NOT EXISTS idx_commit_search_document ON commit_search USING GIN (document);
+CREATE INDEX IF NOT EXISTS idx_commit_search_user_ts ON commit_search (github_username, ts_for_db);
+CREATE INDEX IF NOT EXISTS idx_commit_search_repository ON commit_search (repository);
+
+-- 기존 메시지 backfill
+INSERT INTO commit_search (ts, idx, github_username, repository, text, ts_for_db)
+SELECT
+    sm.ts,
+    a.idx - 1,
+    a.attachment->>'author_name',
+    COALESCE(substring(a.attachment->>'footer' FROM '\|([^>]+)>'), a.attachment->>'footer'),
+    a.attachment->>'text',
+    sm.ts_for_db
+FROM
+    slack_messages sm,
+    LATERAL jsonb_array_elements(sm.attachments) WITH ORDINALITY AS a(attachment, idx)
+WHERE
+    sm.attachments IS NOT NULL
+    AND jsonb_typeof(sm.attachments) = 'array'
+ON CONFLICT (ts, idx) DO NOTHING;
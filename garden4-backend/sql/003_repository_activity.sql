@@ -0,0 +1,55 @@
+-- 저장소별 활동 집계 테이블
+-- 수집(insert_slack_messages)시 새 메시지만큼 누적됨. github_username = '*' 은 저장소 전체 합계
+SET search_path TO garden4;
+
+CREATE TABLE IF NOT EXISTS repository_activity (
+    repository TEXT NOT NULL,
+    github_username VARCHAR(100) NOT NULL,
+    commit_count INTEGER NOT NULL DEFAULT 0,
+    active_days INTEGER NOT NULL DEFAULT 0,
+    last_activity_at TIMESTAMP,
+    PRIMARY KEY (repository, github_username)
+);
+
+CREATE INDEX IF NOT EXISTS idx_repository_activity_leaderboard
+    ON repository_activity (github_username, commit_count DESC);
+
+-- 활동일수 계산용. (저장소, 유저, 날짜) 가 처음 들어올 때만 active_days 를 올림
+CREATE TABLE IF NOT EXISTS repository_activity_days (
+    repository TEXT NOT NULL,
+    github_username VARCHAR(100) NOT NULL,
+    activity_date DATE NOT NULL,
+    PRIMARY KEY (repository, github_username, activity_date)
+);
+
+-- 기존 데이터 backfill (002_commit_search.sql 적용 후 실행)
+-- ts_for_db 는 KST+9시간 으로 저장되어 있으므로 9시간을 빼서 KST 로 변환
+WITH commits AS (
+    SELECT
+        repository,
+        github_username,
+        ts_for_db - INTERVAL '9 hours' AS activity_at,
+        COALESCE(substring(text FROM '(\d+) new commits?')::INTEGER, 1) AS commit_count
+    FROM commit_search
+    WHERE repository IS NOT NULL AND github_username IS NOT NULL
+),
+expanded AS (
+    SELECT repository, github_username, activity_at, commit_count FROM commits
+    UNION ALL
+    SELECT repository, '*', activity_at, commit_count FROM commits
+),
+days AS (
+    INSERT INTO repository_activity_days (repository, github_username, activity_date)
+    SELECT DISTINCT repository, github_username, activity_at::DATE FROM expanded
+    ON CONFLICT DO NOTHING
+)
+INSERT INTO repository_activity (repository, github_username, commit_count, active_days, last_activity_at)
+SELECT
+    repository,
+    github_username,
+    SUM(commit_count),
+    COUNT(DISTINCT activity_at::DATE),
+    MAX(activity_at)
+FROM expanded
+GROUP BY repository, github_username
+ON CONFLICT (repository, github_username) DO NOTHING;
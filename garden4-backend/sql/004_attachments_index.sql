@@ -0,0 +1,11 @@
+-- attachments 인덱스 정리
+-- idx_author_names 는 (attachments -> 'author_name') 에 걸려 있는데, attachments 는 객체 배열이라
+-- 이 식은 항상 NULL 이 되어 어떤 쿼리에도 쓰이지 않음
+-- find_attendance_by_user 등은 attachments @> '[{"author_name": ...}]' 만 쓰므로
+-- @> 전용이고 크기가 작은 jsonb_path_ops GIN 인덱스로 바꾼다
+SET search_path TO garden4;
+
+DROP INDEX IF EXISTS idx_author_names;
+
+CREATE INDEX IF NOT EXISTS idx_attachments_path_ops ON slack_messages USING GIN (attachments jsonb_path_ops);
+DROP INDEX IF EXISTS idx_attachments_author;
@@ -0,0 +1,119 @@
+-- slack_messages 저장 형식 축소
+-- 1. bot_profile(아이콘 URL 등), bot_id, team, type 은 채널 전체에서 거의 같은 값이 반복되므로
+--    bot_profiles 테이블에 한 번만 저장하고 slack_messages 는 bot_profile_id 로 참조
+-- 2. attachments 는 출석/화면에 쓰는 필드(garden.py ATTACHMENT_FIELDS)만 남김.
+--    author_icon, footer_icon, color, mrkdwn_in, fallback 등이 있는 원본은 slack_message_raw 로 옮김
+--    (PostgreSQL 은 2KB 가 안 되는 row 는 압축/TOAST 하지 않으므로 같은 테이블의 컬럼으로 두면 heap 이 줄지 않음)
+--    원본이 필요 없으면 TRUNCATE slack_message_raw
+-- 적용 후 실제로 테이블 크기를 줄이려면 (트랜잭션 밖에서) CLUSTER garden4.slack_messages USING slack_messages_ts_key
+-- (VACUUM FULL 은 UPDATE 로 섞인 row 순서를 그대로 두므로 ts 순서로 읽는 커밋 내역 조회가 더 많은 페이지를 읽게 됨)
+SET search_path TO garden4;
+
+CREATE TABLE IF NOT EXISTS bot_profiles (
+    id SERIAL PRIMARY KEY,
+    -- bot_id, team, type, profile 을 합친 값의 md5. 같은 조합은 한 row
+    digest CHAR(32) UNIQUE NOT NULL,
+    bot_id VARCHAR(20),
+    team VARCHAR(20),
+    type VARCHAR(20),
+    profile JSONB,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS slack_message_raw (
+    ts VARCHAR(20) PRIMARY KEY REFERENCES slack_messages (ts) ON DELETE CASCADE,
+    payload JSONB NOT NULL
+);
+
+-- lz4 없이 빌드된 서버는 기본 압축(pglz) 사용
+DO $$
+BEGIN
+    ALTER TABLE slack_message_raw ALTER COLUMN payload SET COMPRESSION lz4;
+EXCEPTION WHEN feature_not_supported THEN
+    RAISE NOTICE 'lz4 not supported, payload uses default compression';
+END $$;
+
+ALTER TABLE slack_messages ADD COLUMN IF NOT EXISTS bot_profile_id INTEGER REFERENCES bot_profiles (id);
+
+-- 기존 메시지 migration (이미 적용된 row 는 bot_profile_id 가 있으므로 건너뜀)
+CREATE TEMPORARY TABLE slim_storage_targets ON COMMIT DROP AS
+SELECT
+    ts,
+    md5(jsonb_build_array(bot_id, team, type, bot_profile)::text) AS digest,
+    bot_id, team, type, bot_profile, attachments
+FROM slack_messages
+WHERE bot_profile_id IS NULL
+  AND (attachments IS NULL OR jsonb_typeof(attachments) = 'array');
+
+INSERT INTO bot_profiles (digest, bot_id, team, type, profile)
+SELECT DISTINCT ON (digest) digest, bot_id, team, type, bot_profile
+FROM slim_storage_targets
+ON CONFLICT (digest) DO NOTHING;
+
+INSERT INTO slack_message_raw (ts, payload)
+SELECT ts, jsonb_build_object('attachments', attachments)
+FROM slim_storage_targets
+WHERE attachments IS NOT NULL
+ON CONFLICT (ts) DO NOTHING;
+
+UPDATE slack_messages sm
+SET
+    bot_profile_id = bp.id,
+    attachments = (
+        SELECT jsonb_agg(
+            jsonb_strip_nulls(jsonb_build_object(
+                'author_name', a.attachment->'author_name',
+                'text', a.attachment->'text',
+                'footer', a.attachment->'footer',
+                'pretext', a.attachment->'pretext',
+                'title', a.attachment->'title',
+                'title_link', a.attachment->'title_link'
+            ))
+            ORDER BY a.idx
+        )
+        FROM jsonb_array_elements(sm.attachments) WITH ORDINALITY AS a(attachment, idx)
+    ),
+    bot_id = NULL,
+    team = NULL,
+    type = NULL,
+    bot_profile = NULL
+FROM slim_storage_targets t
+JOIN bot_profiles bp ON bp.digest = t.digest
+WHERE sm.ts = t.ts;
+
+-- 축소된 attachments 에는 fallback 이 없으므로 원본에서 읽음
+DROP VIEW IF EXISTS commit_messages;
+CREATE VIEW commit_messages AS
+SELECT
+    sm.id,
+    sm.ts,
+    sm.ts_for_db,
+    a.attachment->>'author_name' AS github_username,
+    a.attachment->>'text' AS commit_message,
+    COALESCE(raw.payload->'attachments'->(a.idx::int - 1)->>'fallback', a.attachment->>'fallback') AS fallback,
+    a.attachment->>'footer' AS repository,
+    sm.created_at
+FROM
+    slack_messages sm
+    LEFT JOIN slack_message_raw raw ON raw.ts = sm.ts,
+    LATERAL jsonb_array_elements(sm.attachments) WITH ORDINALITY AS a(attachment, idx)
+WHERE
+    sm.attachments IS NOT NULL;
+
+-- 예전 형식으로 보고 싶을 때
+CREATE OR REPLACE VIEW slack_messages_expanded AS
+SELECT
+    sm.id,
+    sm.ts,
+    sm.ts_for_db,
+    COALESCE(sm.bot_id, bp.bot_id) AS bot_id,
+    COALESCE(sm.type, bp.type) AS type,
+    sm.text,
+    sm."user",
+    COALESCE(sm.team, bp.team) AS team,
+    COALESCE(sm.bot_profile, bp.profile) AS bot_profile,
+    COALESCE(raw.payload->'attachments', sm.attachments) AS attachments,
+    sm.created_at
+FROM slack_messages sm
+LEFT JOIN bot_profiles bp ON bp.id = sm.bot_profile_id
+LEFT JOIN slack_message_raw raw ON raw.ts = sm.ts;
@@ -0,0 +1,27 @@
+-- 백그라운드 작업 큐
+-- /attendance/collect/, /attendance/csv/ 는 여기에 작업을 넣고 바로 응답하고,
+-- attendance/cli_worker.py 가 FOR UPDATE SKIP LOCKED 로 하나씩 가져가서 처리한다 (attendance/jobs.py)
+SET search_path TO garden4;
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind VARCHAR(20) NOT NULL,
+    params JSONB NOT NULL DEFAULT '{}'::jsonb,
+    -- queued, running, done, failed
+    status VARCHAR(10) NOT NULL DEFAULT 'queued',
+    progress JSONB,
+    result JSONB,
+    error TEXT,
+    attempts SMALLINT NOT NULL DEFAULT 0,
+    worker VARCHAR(100),
+    created_at TIMESTAMP DEFAULT NOW(),
+    started_at TIMESTAMP,
+    -- 처리 중인 worker 가 주기적으로 갱신. 오래 갱신되지 않으면 worker 가 죽은 것으로 보고 다시 queued 로 돌림
+    heartbeat_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs (id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs (heartbeat_at) WHERE status = 'running';
+-- 같은 작업(kind, params)은 대기/처리 중인 것이 하나만 있도록 함. enqueue 는 INSERT ... ON CONFLICT DO NOTHING 으로 넣음
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_unique ON jobs (kind, params) WHERE status IN ('queued', 'running');
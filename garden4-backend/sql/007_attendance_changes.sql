@@ -0,0 +1,17 @@
+-- 출석부 변경 기록 (append-only)
+-- 수집할 때마다 바뀐 (유저, 날짜, 첫 출석 시간) 칸만 version 순서로 쌓고,
+-- /attendance/api/changes?since=<version> 은 그 이후의 칸만 내려준다 (Garden.record_attendance_changes)
+-- first_ts 는 KST. NULL 이면 그 날의 출석이 없어진 것 (메시지 전체 삭제 등)
+-- 처음 수집할 때 비어 있으면 모든 유저의 출석부를 한 번 기록함
+SET search_path TO garden4;
+
+CREATE TABLE IF NOT EXISTS attendance_changes (
+    version BIGSERIAL PRIMARY KEY,
+    member VARCHAR(100) NOT NULL,
+    gardening_date DATE NOT NULL,
+    first_ts TIMESTAMP,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- 유저의 현재 출석부(칸마다 마지막 version) 조회용
+CREATE INDEX IF NOT EXISTS idx_attendance_changes_member ON attendance_changes (member, gardening_date, version DESC);
@@ -0,0 +1,24 @@
+-- slack_messages 의 시간 컬럼 정리
+-- ts_for_db 는 naive TIMESTAMP 라서 기존 데이터(KST+9시간)와 수집한 서버의 timezone 에 따라 기준이 달라질 수 있고,
+-- 읽을 때마다 row 별로 9시간을 빼야 했음. ts(Slack epoch 문자열) 에서 바로 만든 컬럼을 추가함
+--   ts_at          timestamptz. 조회시 ts_at AT TIME ZONE 'Asia/Seoul' 로 KST 를 바로 받음
+--   gardening_date 새벽 4시 기준 날짜 (KST - 4시간). 전날 출석이 없을 때 전날로 치는 규칙은 Garden.build_attendance 에서 적용
+-- 수집(Garden.insert_slack_messages) 할 때 같이 채움. ts_for_db 는 예전 쿼리/뷰 호환용으로 남겨둠
+-- 메시지는 ts 순서로 쌓이고 CLUSTER 되어 있으므로 범위 조회는 작은 BRIN 인덱스로 충분함
+-- 적용 후 (트랜잭션 밖에서) CLUSTER garden4.slack_messages USING slack_messages_ts_key 로 backfill UPDATE 가 남긴 공간을 정리
+SET search_path TO garden4;
+
+ALTER TABLE slack_messages ADD COLUMN IF NOT EXISTS ts_at TIMESTAMPTZ;
+ALTER TABLE slack_messages ADD COLUMN IF NOT EXISTS gardening_date DATE;
+
+-- 기존 메시지 backfill (이미 채운 row 는 건너뜀)
+UPDATE slack_messages
+SET ts_at = to_timestamp(ts::double precision),
+    gardening_date = ((to_timestamp(ts::double precision) AT TIME ZONE 'Asia/Seoul') - INTERVAL '4 hours')::date
+WHERE ts_at IS NULL;
+
+ALTER TABLE slack_messages ALTER COLUMN ts_at SET NOT NULL;
+ALTER TABLE slack_messages ALTER COLUMN gardening_date SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_slack_messages_ts_at ON slack_messages USING BRIN (ts_at);
+CREATE INDEX IF NOT EXISTS idx_slack_messages_gardening_date ON slack_messages USING BRIN (gardening_date);